@@ -1,10 +1,16 @@
 import streamlit as st
 import pandas as pd
-import glob
-import os
 import numpy as np
 import plotly.express as px
 
+from utils.anomalies import (MIN_EXPORT_VOLUME, MIN_GROWTH, Z_THRESHOLD, anomalous_partners, anomaly_table,
+                             scan_anomalies)
+from utils.cube import load_cube
+from utils.data_service import dataset_version, frame
+from utils.eurostat_cache import data_version
+from utils.labels import EU27_PATTERN
+from utils.monthly_anomalies import MIN_MONTHLY_VOLUME, MIN_RUN, breakouts, seasonal_series
+
 st.set_page_config(page_title="Detecting Anomalies", page_icon="🌍", layout="wide")
 
 with st.sidebar:
@@ -28,7 +34,7 @@ We began by collecting extensive EU export data for all partner countries from *
          This rich dataset allowed us to **track long-term trends** in export volumes; **establish historical baselines** 
          for each country's trade activity and **detect deviations** that may signal significant shifts in trade relationships.
 
-> NB. For 2016, the dataset contains different names for some countries: for example, Uzbekistan is called 'Ouzbekistan', Kyrgyzstan is called 'Kirghizistan', Armenia is called 'Arménie', and this has caused some problems in data processing,  so we need to rename these countries to their correct names in order to be consistent with data from other years.
+> NB. For 2016, the dataset contains French names for the partners: for example, Uzbekistan is called 'Ouzbékistan', Kyrgyzstan is called 'Kirghizistan', Armenia is called 'Arménie'. Every partner label is resolved through a country registry with English, French, Russian and Kyrgyz aliases (`data/countries.csv`), so the 2016 figures add up with the English names of the other years.
 
 #### **2. Data Analysis**
 
@@ -42,106 +48,173 @@ A **Z-score** quantifies how many standard deviations an element is from the mea
 We considered a **Z-score greater than 1.96** (corresponding to a 95% confidence level) as statistically significant.
 Additionally, we focused on countries with a **growth rate exceeding 50%** and an export volume greater than **100 million EUR** 
          in 2022 to ensure the changes were substantial and economically meaningful.
+''')
 
-This analysis allows us to demonstrate with figures the real increase in trade volumes in 2022 compared to previous years:
-- **Kyrgyzstan**: 344.8%
-- **Armenia**: 148.9%
-- **Kazakhstan**: 88.6%
-- **Uzbekistan**: 63.8%
-- **Trinidad and Tobago**: 122.6%
+def load_pivot():
+    """PARTNER x YEAR matrix, mapped from the copy every worker on the host shares"""
+    pivot = frame('yearly_pivot').set_index('PARTNER')
+    pivot.columns = pivot.columns.astype(int)
+    return pivot
 
-The data show a sharp increase in trade volumes with the EU in 2022, with Kyrgyzstan and Armenia leading the way. 
-These trends are consistent with shifts in geopolitical and economic dynamics, particularly in the context of sanctions against Russia.
+# The version arguments only key the caches, so a data refresh is picked up without a restart
+@st.cache_data
+def load_scan(window, min_volume, min_growth, z_threshold, version):
+    return scan_anomalies(load_pivot(), window, min_volume, min_growth, z_threshold)
 
-**Note**: Trinidad and Tobago also showed a remarkable increase in exports from the EU, with a growth rate of 122.6%. 
-This is particularly significant given its smaller trade volumes in prior years.
+@st.cache_resource(max_entries=1)
+def get_cube(version):
+    return load_cube()
 
-#### **3. Interpreting the Patterns**
+@st.cache_data
+def load_breakouts(years, min_volume, min_growth, z_threshold, min_run, version):
+    return breakouts(get_cube(version), years=years, min_volume=min_volume, min_growth=min_growth,
+                     z_threshold=z_threshold, min_run=min_run)
 
-Several commonalities (geopolitical proximity, economic ties and temporal correlation) can explain these findings. 
-All the countries identified are neighbours or close to Russia, facilitating potential trade diversion. 
-They have established economic relations with both the EU and Russia, making them viable intermediaries. 
-The timing of the export surges coincides closely with the implementation of sanctions against Russia in 2022.
+def join_names(names):
+    """'A', 'A and B' or 'A, B and C'; an empty string without names"""
+    names = list(names)
+    return f"{', '.join(names[:-1])} and {names[-1]}" if len(names) > 1 else ''.join(names)
 
-So this trend analysis allows us to identify anomalies and provide a list of countries to investigate [further](/Data_Analysis_and_Visualization).
-''')
+# Russia's neighbours the project follows; other partners the scan flags are noted apart
+INTERMEDIARIES = ['Kyrgyzstan', 'Armenia', 'Kazakhstan', 'Uzbekistan']
+FINDINGS_YEAR = 2022
 
-@st.cache_data
-def load_data():
-    
-    file_paths = glob.glob(os.path.join("data/eu_year_export", '*.csv'))
-    dataframes = [pd.read_csv(file) for file in file_paths]
-    data = pd.concat(dataframes, ignore_index=True)
-    return data
-
-data = load_data()
-data['YEAR'] = data['PERIOD'].str[-4:].astype(int)
-
-data = data.dropna(subset=['YEAR'])
-data['YEAR'] = data['YEAR'].astype(int)
-MIN_EXPORT_VOLUME = 100000000
-
-# Step 3: Pivot the data for yearly comparison
-pivot_data = data.pivot_table(
-    index='PARTNER', columns='YEAR', values='VALUE_IN_EUR', aggfunc='sum'
-).fillna(0)
-
-pivot_data.columns = pivot_data.columns.astype(int)
-
-# Step 4: Calculate year-over-year growth percentages
-for year in range(2010, 2023):
-    if year + 1 in pivot_data.columns:
-        pivot_data[f'GROWTH_{year}_{year+1}'] = ((pivot_data[year + 1] - pivot_data[year]) / pivot_data[year].replace(0, np.nan)) * 100
-
-# Step 5: Identify statistically significant growth from 2021 to 2022
-# Calculate the mean and standard deviation of previous growth rates (2019-2020 and 2020-2021)
-growth_cols = [f'GROWTH_{year}_{year+1}' for year in range(2010, 2021) if f'GROWTH_{year}_{year+1}' in pivot_data.columns]
-pivot_data['MEAN_PREV_GROWTH'] = pivot_data[growth_cols].mean(axis=1)
-pivot_data['STD_PREV_GROWTH'] = pivot_data[growth_cols].std(axis=1)
-
-# Calculate Z-score for the growth from 2021 to 2022
-pivot_data['Z_SCORE_2021_2022'] = (pivot_data['GROWTH_2021_2022'] - pivot_data['MEAN_PREV_GROWTH']) / pivot_data['STD_PREV_GROWTH']
-
-
-# Consider growth significant if Z-score > 1.96 (95% confidence interval) and growth > 50%
-significant_growth_countries = pivot_data[
-    (pivot_data['Z_SCORE_2021_2022'] > 1.96) & 
-    (pivot_data['GROWTH_2021_2022'] > 50) &
-    (pivot_data[2022] > MIN_EXPORT_VOLUME)  # Ensure export volume in 2022 is significant
-]
-
-# Remove infinite and NaN values resulting from division by zero
-significant_growth_countries = significant_growth_countries.replace([np.inf, -np.inf], np.nan).dropna(subset=['Z_SCORE_2021_2022'])
-significant_growth_countries = significant_growth_countries.sort_values('Z_SCORE_2021_2022', ascending=False)
-
-st.subheader("Countries with Significant Growth in Exports from EU (2021-2022)")
-st.write('''
-The following countries exhibited statistically significant growth in exports from the EU from 2021 to 2022 (Z-score > 1.96 and growth > 50%):
-''')
+findings = anomaly_table(load_pivot(), load_scan(None, float(MIN_EXPORT_VOLUME), float(MIN_GROWTH), Z_THRESHOLD,
+                                                 dataset_version('yearly_pivot')),
+                         FINDINGS_YEAR)
+findings = findings.set_index('PARTNER')[f'GROWTH_{FINDINGS_YEAR - 1}_{FINDINGS_YEAR}'].sort_values(ascending=False)
+intermediaries = findings[findings.index.isin(INTERMEDIARIES)]
+others = findings[~findings.index.isin(INTERMEDIARIES)]
 
-significant_growth_countries = significant_growth_countries.reset_index()
+if len(intermediaries):
+    st.write(f'''
+This analysis allows us to demonstrate with figures the real increase in trade volumes in {FINDINGS_YEAR} compared to previous years:
 
-display_columns = ['PARTNER', 2010, 2011, 2012, 2013, 2014, 2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 'GROWTH_2019_2020', 'GROWTH_2020_2021', 'GROWTH_2021_2022', 'MEAN_PREV_GROWTH', 'STD_PREV_GROWTH', 'Z_SCORE_2021_2022']
+{chr(10).join(f"- **{partner}**: {growth:.1f}%" for partner, growth in intermediaries.items())}
 
-st.dataframe(significant_growth_countries[display_columns].round(2))
+The data show a sharp increase in trade volumes with the EU in {FINDINGS_YEAR}, with {join_names(intermediaries.index[:2])} leading the way. 
+These trends are consistent with shifts in geopolitical and economic dynamics, particularly in the context of sanctions against Russia.
+''')
+elif INTERMEDIARIES:
+    st.write(f"None of {join_names(INTERMEDIARIES)} passes the thresholds in {FINDINGS_YEAR} with the current data.")
 
-st.subheader("Visualization of Export Growth Rates (2021-2022)")
+if len(others):
+    st.write(f'''
+**Note**: {'one other partner passes' if len(others) == 1 else f'{len(others)} other partners pass'} the same thresholds in {FINDINGS_YEAR}: {', '.join(f"{partner} ({growth:.1f}%)" for partner, growth in others.items())}. 
+Every flagged partner is listed in the annual scan below.
+''')
 
-fig = px.bar(
-    significant_growth_countries,
-    x='PARTNER',
-    y='GROWTH_2021_2022',
-    title='Year-over-Year Export Growth Rates (2021-2022)',
-    labels={'GROWTH_2021_2022': 'Growth Rate (%)', 'PARTNER': 'Country'},
-    hover_data=['Z_SCORE_2021_2022']
-)
+if len(intermediaries):
+    single = len(intermediaries) == 1
+    st.write(f'''
+#### **3. Interpreting the Patterns**
 
-st.plotly_chart(fig, use_container_width=True)
+Several commonalities (geopolitical proximity, economic ties and temporal correlation) can explain these findings. 
+{join_names(intermediaries.index)} {'is a neighbour of' if single else 'are neighbours of'} or close to Russia, facilitating potential trade diversion. 
+{'It has' if single else 'They have'} established economic relations with both the EU and Russia, making {'it a viable intermediary' if single else 'them viable intermediaries'}. 
+The timing of the export surges coincides closely with the implementation of sanctions against Russia in {FINDINGS_YEAR}.
+''')
 
 st.write('''
+So this trend analysis allows us to identify anomalies and provide a list of countries to investigate [further](/Data_Analysis_and_Visualization).
+''')
+
+mode = st.radio("Resolution", ["Annual", "Monthly"], horizontal=True)
+
+if mode == "Annual":
+    pivot_data = load_pivot()
+    target_years = [int(year) for year in pivot_data.columns[2:]]
+
+    with st.expander("Scan settings"):
+        col_year, col_window = st.columns(2)
+        target_year = col_year.selectbox("Target year", target_years, index=target_years.index(2022))
+        window = col_window.number_input(
+            "Baseline window (growth rates before the target year, 0 = all)", min_value=0, value=0, step=1)
+        col_z, col_growth, col_volume = st.columns(3)
+        z_threshold = col_z.number_input("Z-score threshold", value=Z_THRESHOLD, step=0.1)
+        min_growth = col_growth.number_input("Minimum growth, %", value=float(MIN_GROWTH), step=10.0)
+        min_volume = col_volume.number_input(
+            "Minimum export volume, EUR", value=float(MIN_EXPORT_VOLUME), step=10000000.0, format="%.0f")
+
+    scan = load_scan(window or None, min_volume, min_growth, z_threshold, dataset_version('yearly_pivot'))
+    significant_growth_countries = anomaly_table(pivot_data, scan, target_year)
+
+    growth_column = f'GROWTH_{target_year - 1}_{target_year}'
+    z_column = f'Z_SCORE_{target_year - 1}_{target_year}'
+    period = f'{target_year - 1}-{target_year}'
+
+    st.subheader(f"Countries with Significant Growth in Exports from EU ({period})")
+    st.write(f'''
+    The following countries exhibited statistically significant growth in exports from the EU from {target_year - 1} to {target_year} (Z-score > {z_threshold:g} and growth > {min_growth:g}%):
+    ''')
+
+    st.dataframe(significant_growth_countries.round(2))
+
+    st.subheader(f"Visualization of Export Growth Rates ({period})")
+
+    fig = px.bar(
+        significant_growth_countries,
+        x='PARTNER',
+        y=growth_column,
+        title=f'Year-over-Year Export Growth Rates ({period})',
+        labels={growth_column: 'Growth Rate (%)', 'PARTNER': 'Country'},
+        hover_data=[z_column]
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("All anomalous partner-years"):
+        all_anomalies = anomalous_partners(scan)
+        st.dataframe(all_anomalies[['YEAR', 'PARTNER', 'VALUE_IN_EUR', 'GROWTH', 'Z_SCORE']].round(2),
+                     hide_index=True)
+
+else:
+    cube_version = data_version()
+    cube = get_cube(cube_version)
+    st.subheader("First Monthly Breakout after February 2022")
+    st.write('''
+Monthly exports from every EU reporter to each partner are compared with a **seasonal-naive baseline**: the average of the same calendar month in the previous years.
+The log ratio of actual to expected exports is standardized against the pair's own history up to February 2022, and a **breakout** is the first month after February 2022
+from which the Z-score, the growth over the baseline and the export volume stay above the thresholds for consecutive months.
+''')
+
+    with st.expander("Scan settings"):
+        col_years, col_run = st.columns(2)
+        years = col_years.number_input("Prior years in the baseline (0 = all)", min_value=0, value=0, step=1)
+        min_run = col_run.number_input("Consecutive anomalous months", min_value=1, value=MIN_RUN, step=1)
+        col_z, col_growth, col_volume = st.columns(3)
+        z_threshold = col_z.number_input("Z-score threshold", value=Z_THRESHOLD, step=0.1)
+        min_growth = col_growth.number_input("Minimum growth over baseline, %", value=float(MIN_GROWTH), step=10.0)
+        min_volume = col_volume.number_input(
+            "Minimum monthly export volume, EUR", value=float(MIN_MONTHLY_VOLUME), step=1000000.0, format="%.0f")
+
+    found = load_breakouts(years or None, min_volume, min_growth, z_threshold, int(min_run), cube_version)
+    eu27 = np.array(cube.reporters, dtype=object)[cube.reporter_mask(EU27_PATTERN)]
+    eu_found = found[found['REPORTER'].isin(eu27)]
+
+    st.write("**EU-27 total exports**")
+    st.dataframe(eu_found.drop(columns='REPORTER').round(2), hide_index=True)
+
+    partner = st.selectbox("Partner", cube.partners, index=cube.partners.index('Kyrgyzstan'))
+    series = seasonal_series(cube, eu27[0], partner, years=years or None).reset_index()
+    fig = px.line(
+        series,
+        x='PERIOD',
+        y=['VALUE_IN_EUR', 'FORECAST'],
+        title=f'EU-27 Exports to {partner} against the Seasonal-Naive Baseline',
+        labels={'value': 'Value in EUR', 'PERIOD': 'Month', 'variable': 'Series'}
+    )
+    fig.add_vline(x=pd.Timestamp('2022-02-01'), line_dash="dash", line_color="red")
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.write("**Breakouts of individual EU reporters**")
+    st.dataframe(found[~found['REPORTER'].isin(eu27)].round(2), hide_index=True)
+
+if len(intermediaries):
+    st.write(f'''
          #### **Conclusion**
 
-So we can see that several countries, particularly **Kyrgyzstan**, **Armenia**, **Kazakhstan**, and **Uzbekistan**, have experienced significant and anomalous increases in exports from the EU in 2022. These increases are statistically significant, with Z-scores exceeding 1.96 and growth rates well above 50%, accompanied by substantial export volumes exceeding 100 million EUR.
+So we can see that of the {len(findings)} partners flagged in {FINDINGS_YEAR}, {'one country,' if len(intermediaries) == 1 else 'several countries, particularly'} {join_names(f"**{partner}**" for partner in intermediaries.index)}, {'has' if len(intermediaries) == 1 else 'have'} experienced significant and anomalous increases in exports from the EU in {FINDINGS_YEAR}. These increases are statistically significant, with Z-scores exceeding 1.96 and growth rates well above 50%, accompanied by substantial export volumes exceeding 100 million EUR.
 
 The timing and magnitude of these trade surges, along with the geopolitical proximity and economic ties of these countries to Russia, suggest the possibility of trade redirection that may be facilitating the circumvention of EU sanctions against Russia.
 
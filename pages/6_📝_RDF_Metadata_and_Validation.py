@@ -1,12 +1,76 @@
+import os
+import threading
+
 import streamlit as st
-from rdflib import Graph
+
+from utils.data_service import dataset_version, frame
+from utils.rdf_writer import write_jsonld
 
 st.set_page_config(page_title="RDF Metadata and Validation", page_icon="🌍", layout="wide")
 
-def load_rdf_metadata(file_path):
-    g = Graph()
-    g.parse(file_path, format='turtle')
-    return g
+METADATA_TURTLE = 'data/ttl/eurostat_metadata.ttl'
+METADATA_JSONLD = 'data/ttl/eurostat_metadata.json'
+DATASET_TURTLE = 'data/ttl/eurostat_data.ttl'
+DATASET_JSONLD = 'data/ttl/eurostat_data.json'
+JSONLD_CACHE_DIR = 'data/cache/jsonld'
+PREVIEW_LINES = 200
+
+
+@st.cache_data
+def load_file_bytes(file_path, mtime):
+    """Raw contents of a pre-built RDF file, cached until the file changes"""
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+def file_bytes(file_path):
+    return load_file_bytes(file_path, os.path.getmtime(file_path))
+
+
+@st.cache_data
+def preview_offsets(file_path, mtime, lines_per_page=PREVIEW_LINES):
+    """Byte offsets at which each preview page of a text file starts"""
+    offsets = []
+    position = 0
+    with open(file_path, 'rb') as f:
+        for number, line in enumerate(f):
+            if number % lines_per_page == 0:
+                offsets.append(position)
+            position += len(line)
+    return offsets
+
+
+def read_preview(file_path, offset, lines_per_page=PREVIEW_LINES):
+    """One page of lines of a text file, read from its byte offset"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return b''.join(f.readline() for _ in range(lines_per_page)).decode('utf-8')
+
+
+def cached_dataset_jsonld(version):
+    """Path of the compact JSON-LD of the observations, streamed once per data version to a file
+    from the table every worker on the host shares"""
+    path = os.path.join(JSONLD_CACHE_DIR, f"eurostat_data-{version[:16]}.json")
+    if os.path.exists(path):
+        return path
+    os.makedirs(JSONLD_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        write_jsonld([frame('observations')], out)
+    os.replace(tmp_path, path)
+    # Readers of an older version keep their open file after the unlink
+    for name in os.listdir(JSONLD_CACHE_DIR):
+        if name != os.path.basename(path) and not name.endswith('.tmp'):
+            os.remove(os.path.join(JSONLD_CACHE_DIR, name))
+    return path
+
+
+def dataset_jsonld():
+    """The JSON-LD file written by rdf_creator, or the same document written from the tables"""
+    if os.path.exists(DATASET_JSONLD):
+        return file_bytes(DATASET_JSONLD)
+    return file_bytes(cached_dataset_jsonld(dataset_version('observations')))
+
 
 with st.sidebar:
     st.markdown('''
@@ -41,54 +105,50 @@ with tab1:
 
     st.header("RDF Metadata in Turtle Format")
 
-    file_path = 'data/ttl/eurostat_metadata.ttl'
-    metadata_graph = load_rdf_metadata(file_path)
-    rdf_metadata_turtle = metadata_graph.serialize(format='turtle')
-
-    st.text_area("Turtle Representation", rdf_metadata_turtle, height=500)
+    st.text_area("Turtle Representation", file_bytes(METADATA_TURTLE).decode('utf-8'), height=500)
 
 # ------------------- Dataset in Turtle Tab -------------------
 with tab3:
     st.header("RDF Dataset in Turtle Format")
 
-    file_path_dataset = 'data/ttl/eurostat_data.ttl'
-    dataset_graph = load_rdf_metadata(file_path_dataset)
-
-    rdf_dataset_turtle = dataset_graph.serialize(format='turtle')
+    offsets = preview_offsets(DATASET_TURTLE, os.path.getmtime(DATASET_TURTLE))
+    st.write(f"The dataset file has {os.path.getsize(DATASET_TURTLE) / 1e6:.1f} MB; "
+             f"it is shown {PREVIEW_LINES} lines at a time.")
+    page = st.number_input("Page", min_value=1, max_value=len(offsets), value=1, step=1)
 
-    st.text_area("Turtle Representation of Dataset", rdf_dataset_turtle, height=500)
+    st.text_area(f"Turtle Representation of Dataset (page {page} of {len(offsets)})",
+                 read_preview(DATASET_TURTLE, offsets[page - 1]), height=500)
 
 # ------------------- Download Options Tab -------------------
 with tab4:
     st.header("Download Options")
     st.write("You can download the metadata and dataset in Turtle and JSON-LD formats below.")
 
+    # The files are read only when a button is clicked, and then shared by every session
     st.download_button(
         label="Download RDF Metadata (Turtle)",
-        data=rdf_metadata_turtle,
+        data=lambda: file_bytes(METADATA_TURTLE),
         file_name='eurostat_metadata.ttl',
         mime='text/turtle'
     )
 
-    rdf_metadata_jsonld = metadata_graph.serialize(format='json-ld')
     st.download_button(
         label="Download RDF Metadata (JSON-LD)",
-        data=rdf_metadata_jsonld,
+        data=lambda: file_bytes(METADATA_JSONLD),
         file_name='eurostat_metadata.json',
         mime='application/ld+json'
     )
 
     st.download_button(
         label="Download RDF Dataset (Turtle)",
-        data=rdf_dataset_turtle,
+        data=lambda: file_bytes(DATASET_TURTLE),
         file_name='eurostat_data.ttl',
         mime='text/turtle'
     )
 
-    rdf_dataset_jsonld = dataset_graph.serialize(format='json-ld')
     st.download_button(
         label="Download RDF Dataset (JSON-LD)",
-        data=rdf_dataset_jsonld,
+        data=dataset_jsonld,
         file_name='eurostat_data.json',
         mime='application/ld+json'
     )
@@ -1,9 +1,22 @@
+import argparse
+import hashlib
+import json
 import os
-import glob
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 from rdflib import Graph, Namespace, Literal, RDF, URIRef
 from rdflib.namespace import XSD, DCTERMS
-import urllib.parse
+
+from utils.eurostat_cache import file_fingerprint, load_eurostat, load_manifest, refresh_cache
+from utils.periods import month_labels
+from utils.rdf_distributions import DISTRIBUTIONS, publish
+from utils.countries import country_urirefs
+from utils.rdf_writer import (OBSERVATION_KEY, check_unique, merge_shards, ndjson_to_jsonld, observation_ids,
+                              write_jsonld, write_observations)
 
 EX = Namespace("https://sanctions.streamlit.app/ns#")
 QB = Namespace("http://purl.org/linked-data/cube#")
@@ -14,25 +27,6 @@ PROV = Namespace("http://www.w3.org/ns/prov#")
 SCHEMA = Namespace("http://schema.org/")
 FOAF = Namespace("http://xmlns.com/foaf/0.1/")
 
-g = Graph()
-metadata_graph = Graph()
-
-g.bind("ex", EX)
-g.bind("qb", QB)
-g.bind("dct", DCTERMS)
-g.bind("wikidata", WIKIDATA)
-g.bind("gr", GR)
-g.bind("dcat", DCAT)
-g.bind("prov", PROV)
-
-metadata_graph.bind("ex", EX)
-metadata_graph.bind("dct", DCTERMS)
-metadata_graph.bind("wikidata", WIKIDATA)
-metadata_graph.bind("dcat", DCAT)
-metadata_graph.bind("prov", PROV)
-metadata_graph.bind("schema", SCHEMA)
-metadata_graph.bind("foaf", FOAF)
-
 folders = {
     "Armenia": 'data/armenia_export_eurostat',
     "Russia": 'data/russia_export_eurostat',
@@ -43,157 +37,402 @@ folders = {
 
 folders["National"] = 'data/national_data_converter'
 
-combined_dfs = []
+OUTPUT_DIR = 'data/ttl'
+SHARD_DIR = 'shards'
+SHARD_MANIFEST = 'manifest.json'
+EXTENSIONS = {'turtle': 'ttl', 'nt': 'nt', 'jsonld': 'ndjson'}
+SHARD_VERSION = 1  # bump when the emitted triples change, to rebuild every shard
+# Files publish() derives from a merged file, and the merged file each one is made from
+DERIVED = {'eurostat_data.nt.gz': 'eurostat_data.nt', 'eurostat_data.npz': 'eurostat_data.nt'}
+
 
 def preprocess_period(df):
     """
     Standardizes the PERIOD column to a common format (YYYY-MM).
-    Handles cases like '201904-Apr. 2019' or 'Aug. 2024'.
+    Handles cases like '201904-Apr. 2019' or 'Aug. 2024'; raises ValueError on unknown formats.
     """
-    # Check if PERIOD is in the format '201904-Apr. 2019'
-    if df['PERIOD'].str.contains(r'^\d{6}-').any():
-        # Extract the first six digits (YYYYMM) and convert to YYYY-MM
-        df['PERIOD'] = pd.to_datetime(df['PERIOD'].str.extract(r'^(\d{6})')[0], format='%Y%m').dt.strftime('%Y-%m')
-    elif df['PERIOD'].str.contains(r'^[A-Za-z]{3}\. \d{4}$').any():
-        # Parse periods like 'Aug. 2024' to YYYY-MM
-        df['PERIOD'] = pd.to_datetime(df['PERIOD'], format='%b. %Y').dt.strftime('%Y-%m')
-    else:
-        # Raise an error if an unknown format is encountered
-        raise ValueError(f"Unexpected PERIOD format in the data: {df['PERIOD'].iloc[0]}")
+    df['PERIOD'] = month_labels(df['PERIOD'])
     return df
 
-# Process each folder
-for country, folder_path in folders.items():
-    for file in glob.glob(os.path.join(folder_path, '*.csv')):
-        df = pd.read_csv(file)
-        df['COUNTRY'] = country  # Add a column for the country
-        df = preprocess_period(df)  # Standardize PERIOD format
-        combined_dfs.append(df)
-
-# Combine all data
-combined_df = pd.concat(combined_dfs, ignore_index=True)
-
-
-def get_country_uri(country_name):
-    country_map = {
-        "Austria": WIKIDATA['Q40'],
-        "Belgium (incl. Luxembourg 'LU' -> 1998)": WIKIDATA['Q31'],
-        "Bulgaria": WIKIDATA['Q219'],
-        "Croatia": WIKIDATA['Q224'],
-        "Cyprus": WIKIDATA['Q229'],
-        "Czechia": WIKIDATA['Q213'],
-        "Denmark": WIKIDATA['Q35'],
-        "Estonia": WIKIDATA['Q191'],
-        "Finland": WIKIDATA['Q33'],
-        "France (incl. Saint Barthélemy 'BL' -> 2012; incl. French Guiana 'GF', Guadeloupe 'GP', Martinique 'MQ', Réunion 'RE' from 1997; incl. Mayotte 'YT' from 2014)": WIKIDATA['Q142'],
-        "Germany (incl. German Democratic Republic 'DD' from 1991)": WIKIDATA['Q183'],
-        "Greece": WIKIDATA['Q41'],
-        "Hungary": WIKIDATA['Q28'],
-        "Ireland (Eire)": WIKIDATA['Q27'],
-        "Italy (incl. San Marino 'SM' -> 1993)": WIKIDATA['Q38'],
-        "Latvia": WIKIDATA['Q211'],
-        "Lithuania": WIKIDATA['Q37'],
-        "Luxembourg": WIKIDATA['Q32'],
-        "Netherlands": WIKIDATA['Q55'],
-        "Poland": WIKIDATA['Q36'],
-        "Portugal": WIKIDATA['Q45'],
-        "Romania": WIKIDATA['Q218'],
-        "Slovakia": WIKIDATA['Q214'],
-        "Slovenia": WIKIDATA['Q215'],
-        "Spain (incl. Canary Islands 'XB' from 1997)": WIKIDATA['Q29'],
-        "Sweden": WIKIDATA['Q34'],
-        "Euro area (AT-01/1999, BE-01/1999, CY-01/2008, DE-01/1999, EE-01/2011, ES-01/1999, FI-01/1999, FR-01/1999, GR-01/2001, HR-01/2023, IE-01/1999, IT-01/1999, LT-01/2015, LU-01/1999, LV-01/2014, MT-01/2008, NL-01/1999, PT-01/1999, SI-01/2007, SK-01/2009)": WIKIDATA['Q25127'],
-        "Euro area - 20 countries (AT, BE, CY, DE, EE, ES, FI, FR, GR, HR, IE, IT, LT, LU, LV, MT, NL, PT, SI, SK)": WIKIDATA['Q25127'],
-        "European Union (AT-01/1995, BE-01/1958, BG-01/2007, CY-05/2004, CZ-05/2004, DE-01/1958, DK-01/1973, EE-05/2004, ES-01/1986, FI-01/1995, FR-01/1958, GB-01/1973->01/2020, GR-01/1981, HR-07/2013, HU-05/2004, IE-01/1973, IT-01/1958, LT-05/2004, LU-01/1958, LV-05/2004, MT-05/2004, NL-01/1958, PL-05/2004, PT-01/1986, RO-01/2007, SE-01/1995, SI-05/2004, SK-05/2004)": WIKIDATA['Q458'],
-        "European Union - 27 countries (AT, BE, BG, CY, CZ, DE, DK, EE, ES, FI, FR, GR, HR, HU, IE, IT, LT, LU, LV, MT, NL, PL, PT, RO, SE, SI, SK)": WIKIDATA['Q458'],
-        "Russia": WIKIDATA['Q159'],
-        "Armenia": WIKIDATA['Q399'],
-        "Kazakhstan": WIKIDATA['Q232'],
-        "Kyrgyzstan": WIKIDATA['Q813'],
-        "Georgia": WIKIDATA['Q230']
-    }
-    return country_map.get(country_name, URIRef(EX + "country/" + urllib.parse.quote(country_name.replace(' ', '_'))))
-
-# Define catalog and dataset URIs
-catalog_uri = EX["catalog"]
-dataset_uri = EX["dataset/eurostat_exports"]
-
-# Add catalog metadata to the metadata graph
-metadata_graph.add((catalog_uri, RDF.type, DCAT.Catalog))
-metadata_graph.add((catalog_uri, DCTERMS.title, Literal("EU Export Dataset Catalog", datatype=XSD.string)))
-metadata_graph.add((catalog_uri, DCTERMS.description, Literal("A catalog of datasets representing EU export information.", datatype=XSD.string)))
-
-# Publisher (ensure it's a foaf:Agent)
-metadata_graph.add((WIKIDATA["Q458"], RDF.type, URIRef("http://xmlns.com/foaf/0.1/Agent")))
-metadata_graph.add((catalog_uri, DCTERMS.publisher, WIKIDATA["Q458"]))
-
-metadata_graph.add((catalog_uri, DCAT.dataset, dataset_uri))
-
-# Add dataset metadata to the metadata graph
-metadata_graph.add((dataset_uri, RDF.type, DCAT.Dataset))
-metadata_graph.add((dataset_uri, DCTERMS.title, Literal("EU Export Data for Various Countries", datatype=XSD.string)))
-metadata_graph.add((dataset_uri, DCTERMS.description, Literal("This dataset contains export data from the European Union to multiple countries, covering 2019-2024.", datatype=XSD.string)))
-metadata_graph.add((dataset_uri, DCTERMS.creator, WIKIDATA["Q458"]))
-metadata_graph.add((dataset_uri, DCTERMS.issued, Literal("2024-11-17", datatype=XSD.date)))
-
-# Temporal (dcterms:temporal must be a PeriodOfTime)
-temporal_uri = EX["time_period/2019-01_to_2024-12"]
-metadata_graph.add((temporal_uri, RDF.type, DCTERMS.PeriodOfTime))
-metadata_graph.add((temporal_uri, SCHEMA.startDate, Literal("2019-01", datatype=XSD.gYearMonth)))
-metadata_graph.add((temporal_uri, SCHEMA.endDate, Literal("2024-12", datatype=XSD.gYearMonth)))
-metadata_graph.add((dataset_uri, DCTERMS.temporal, temporal_uri))
-
-# Spatial (dcterms:spatial must be a Location)
-metadata_graph.add((WIKIDATA["Q458"], RDF.type, DCTERMS.Location))
-metadata_graph.add((dataset_uri, DCTERMS.spatial, WIKIDATA["Q458"]))
-
-# Define distribution with required properties
-distribution_uri = URIRef("https://sanctions.streamlit.app/data/ttl/eurostat_data.ttl")
-metadata_graph.add((distribution_uri, RDF.type, DCAT.Distribution))
-metadata_graph.add((distribution_uri, DCTERMS.format, URIRef("http://purl.org/NET/mediatypes/text/turtle")))  # Media type
-metadata_graph.add((distribution_uri, DCAT.accessURL, URIRef("https://sanctions.streamlit.app/data/ttl/eurostat_data.ttl")))
-metadata_graph.add((dataset_uri, DCAT.distribution, distribution_uri))
-
-# Declare the media type as an instance of dcterms:MediaTypeOrExtent
-metadata_graph.add((URIRef("http://purl.org/NET/mediatypes/text/turtle"), RDF.type, DCTERMS.MediaTypeOrExtent))
-
-# Add missing foaf:name for European Union
-metadata_graph.add((WIKIDATA["Q458"], RDF.type, URIRef("http://xmlns.com/foaf/0.1/Agent")))
-metadata_graph.add((WIKIDATA["Q458"], FOAF.name, Literal("European Union", datatype=XSD.string)))
-
-license_uri = URIRef("https://creativecommons.org/licenses/by/4.0/")
-metadata_graph.add((dataset_uri, DCTERMS.license, license_uri))
-
-for idx, row in combined_df.iterrows():
-    print(row)
-    obs_uri = EX[f'observation{idx+1}']
-    g.add((obs_uri, RDF.type, QB.Observation))
-
-    reporter_uri = get_country_uri(row['REPORTER'])
-    partner_uri = get_country_uri(row['PARTNER'])
-    flow_uri = URIRef(GR['Sell']) if row['FLOW'] == 'EXPORT' else URIRef(GR['Buy'])  # Use GoodRelations to denote type of action
-
-    g.add((obs_uri, EX.reporter, reporter_uri))
-    g.add((obs_uri, EX.partner, partner_uri))
-    g.add((obs_uri, EX.flow, flow_uri))
-    g.add((dataset_uri, DCAT.hasPart, obs_uri))  # Link dataset to observation
 
-    try:
-        period = pd.to_datetime(row['PERIOD'], errors='coerce').strftime('%Y-%m')
-        if pd.isna(period):
-            raise ValueError(f"Invalid date format for PERIOD: {row['PERIOD']}")
-        g.add((obs_uri, EX.period, Literal(period, datatype=XSD.gYearMonth)))
-    except Exception as e:
-        print(f"Error parsing date: {e}")
+def load_folder(country, folder_path):
+    """Observations of one folder with a standardized PERIOD, in a stable order"""
+    df = load_eurostat(folder_path)
+    if df.empty:
+        return df
+    df['COUNTRY'] = country  # Add a column for the country
+    df = preprocess_period(df)  # Standardize PERIOD format
+    # Sort by label, not by category code: the category order depends on the partitions read
+    return df.sort_values(['PERIOD'] + OBSERVATION_KEY, key=lambda column: column.astype(str), ignore_index=True)
+
+
+def shard_name(country, style='turtle'):
+    return f"{country.lower()}.{EXTENSIONS[style]}"
+
 
+def write_shard(country, folder_path, shard_dir, style='turtle'):
+    """Write the observations of one folder to their own shard; returns (path, count, seconds)"""
+    start = time.perf_counter()
+    df = load_folder(country, folder_path)
+    if df.empty:
+        return None, 0, time.perf_counter() - start
+    check_unique(df)
+    path = os.path.join(shard_dir, shard_name(country, style))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        count = write_observations([df], out, style)
+    os.replace(tmp_path, path)
+    return path, count, time.perf_counter() - start
+
+
+def source_hashes(folder_path):
+    """Content hash of every source CSV of a folder, as fingerprinted by the Eurostat cache"""
+    folder = os.path.normpath(folder_path)
+    refresh_cache([folder])
+    return {path: entry['sha256'] for path, entry in sorted(load_manifest()['files'].items())
+            if entry['source'] == folder}
+
+
+def load_shard_manifest(shard_dir):
+    """Shards written so far with the source hashes they were built from"""
     try:
-        value = float(row['VALUE_IN_EUR'])
-        g.add((obs_uri, EX.valueInEUR, Literal(value, datatype=XSD.decimal)))
-    except ValueError:
-        print(f"Invalid VALUE_IN_EUR: {row['VALUE_IN_EUR']}")
+        with open(os.path.join(shard_dir, SHARD_MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = None
+    if manifest is None or manifest.get('version') != SHARD_VERSION:
+        manifest = {'version': SHARD_VERSION, 'shards': {}, 'merged': {}}
+    return manifest
+
+
+def save_shard_manifest(shard_dir, manifest):
+    path = os.path.join(shard_dir, SHARD_MANIFEST)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def forget_merged(output_dir, names):
+    """Drop the manifest entries of combined files written outside write_sharded, so its next run re-merges them"""
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    if not os.path.exists(os.path.join(shard_dir, SHARD_MANIFEST)):
+        return
+    manifest = load_shard_manifest(shard_dir)
+    dropped = [name for name in names if manifest['merged'].pop(name, None) is not None]
+    if dropped:
+        save_shard_manifest(shard_dir, manifest)
+
+
+def shard_is_current(entry, shard_dir, sources):
+    """True when a shard was built from exactly these sources and is still on disk untouched"""
+    if entry is None or entry['sources'] != sources:
+        return False
+    if entry['path'] is None:
+        return True
+    path = os.path.join(shard_dir, entry['path'])
+    return os.path.exists(path) and file_fingerprint(path)['sha256'] == entry['sha256']
+
+
+def merged_names(style):
+    """Combined files write_sharded merges from the shards of a style"""
+    names = [f'eurostat_data.{EXTENSIONS[style]}']
+    if style == 'jsonld':
+        names.append('eurostat_data.json')
+    return names
+
+
+def shards_digest(shards):
+    """The combined files are identified by the hashes of the shards they were merged from"""
+    return hashlib.sha1(''.join(f"{entry['path']}:{entry['sha256']}\n" for entry in shards)
+                        .encode('utf-8')).hexdigest()
+
+
+def current_outputs(output_dir, manifest, sources):
+    """Merged and derived files recorded as built from the current shards of the current sources"""
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    current = set()
+    for style in EXTENSIONS:
+        shards = [manifest['shards'].get(shard_name(country, style)) for country in folders]
+        if all(shard_is_current(entry, shard_dir, sources[country]) for country, entry in zip(folders, shards)):
+            digest = shards_digest(shards)
+            current.update(name for name in merged_names(style) if manifest['merged'].get(name) == digest)
+    for name, source in DERIVED.items():
+        if source in current and manifest['merged'].get(name) == manifest['merged'][source]:
+            current.add(name)
+    return current
+
+
+def prune_outputs(output_dir, manifest, sources):
+    """Delete the merged and derived files built from older sources, so no stale file is published.
+
+    The Turtle file is kept: it is tracked in git and always listed in the metadata.
+    """
+    current = current_outputs(output_dir, manifest, sources)
+    names = [name for style in EXTENSIONS for name in merged_names(style)] + list(DERIVED)
+    for name in names:
+        if name == 'eurostat_data.ttl' or name in current:
+            continue
+        manifest['merged'].pop(name, None)
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Removed {path}: it was built from older sources")
+    save_shard_manifest(os.path.join(output_dir, SHARD_DIR), manifest)
+
+
+def record_derived(output_dir):
+    """Mark the files publish() just wrote as derived from the current merged N-Triples"""
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    manifest = load_shard_manifest(shard_dir)
+    for name, source in DERIVED.items():
+        manifest['merged'][name] = manifest['merged'][source]
+    save_shard_manifest(shard_dir, manifest)
+
+
+def write_sharded(output_dir, style='turtle', workers=None, merge=True, force=False):
+    """Regenerate the shards whose source CSVs changed in a process pool, then merge them in folder order"""
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+    manifest = load_shard_manifest(shard_dir)
+    entries = manifest['shards']
+
+    # Fingerprint in this process so the workers only read an up-to-date cache
+    sources = {country: source_hashes(folder_path) for country, folder_path in folders.items()}
+    stale = [country for country in folders
+             if force or not shard_is_current(entries.get(shard_name(country, style)), shard_dir, sources[country])]
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {country: pool.submit(write_shard, country, folders[country], shard_dir, style)
+                       for country in stale}
+            for country, future in futures.items():
+                path, count, seconds = future.result()
+                name = shard_name(country, style)
+                if path is None:
+                    print(f"{country}: no observations")
+                    if os.path.exists(os.path.join(shard_dir, name)):
+                        os.remove(os.path.join(shard_dir, name))
+                else:
+                    print(f"{country}: {count} observations in {path} ({seconds:.2f}s)")
+                entries[name] = {
+                    'folder': folders[country],
+                    'sources': sources[country],
+                    'path': None if path is None else name,
+                    'observations': count,
+                    'sha256': None if path is None else file_fingerprint(path)['sha256'],
+                }
+                save_shard_manifest(shard_dir, manifest)
+    for country in folders:
+        if country not in stale:
+            print(f"{country}: shard is up to date")
+
+    shards = [entries[shard_name(country, style)] for country in folders]
+    if merge:
+        paths = [os.path.join(shard_dir, entry['path']) for entry in shards if entry['path']]
+        merged = {f'eurostat_data.{EXTENSIONS[style]}': lambda out: merge_shards(paths, out, style)}
+        if style == 'jsonld':
+            merged['eurostat_data.json'] = lambda out: ndjson_to_jsonld(paths, out)
+        digest = shards_digest(shards)
+        for merged_name, write_merged in merged.items():
+            merged_path = os.path.join(output_dir, merged_name)
+            if not stale and manifest['merged'].get(merged_name) == digest and os.path.exists(merged_path):
+                print(f"{merged_path} is up to date")
+                continue
+            tmp_path = f"{merged_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                write_merged(out)
+            os.replace(tmp_path, merged_path)
+            manifest['merged'][merged_name] = digest
+            save_shard_manifest(shard_dir, manifest)
+            print(f"Merged {len(paths)} shards into {merged_path}")
+        prune_outputs(output_dir, manifest, sources)
+    return sum(entry['observations'] for entry in shards)
+
+
+def check_turtle(output_dir=OUTPUT_DIR, workers=None):
+    """True when the Turtle file in output_dir is the one the current sources and code generate"""
+    path = os.path.join(output_dir, 'eurostat_data.ttl')
+    with tempfile.TemporaryDirectory() as scratch:
+        write_sharded(scratch, 'turtle', workers)
+        expected = file_fingerprint(os.path.join(scratch, 'eurostat_data.ttl'))['sha256']
+    if os.path.exists(path) and file_fingerprint(path)['sha256'] == expected:
+        print(f"{path} matches the generator")
+        return True
+    print(f"{path} is out of date: regenerate it with python rdf_creator.py")
+    return False
+
+
+def build_metadata_graph(output_dir=OUTPUT_DIR):
+    """DCAT description of the catalog, the dataset and its distributions found in output_dir"""
+    metadata_graph = Graph()
+    metadata_graph.bind("ex", EX)
+    metadata_graph.bind("dct", DCTERMS)
+    metadata_graph.bind("wikidata", WIKIDATA)
+    metadata_graph.bind("dcat", DCAT)
+    metadata_graph.bind("prov", PROV)
+    metadata_graph.bind("schema", SCHEMA)
+    metadata_graph.bind("foaf", FOAF)
+
+    # Define catalog and dataset URIs
+    catalog_uri = EX["catalog"]
+    dataset_uri = EX["dataset/eurostat_exports"]
+
+    # Add catalog metadata to the metadata graph
+    metadata_graph.add((catalog_uri, RDF.type, DCAT.Catalog))
+    metadata_graph.add((catalog_uri, DCTERMS.title, Literal("EU Export Dataset Catalog", datatype=XSD.string)))
+    metadata_graph.add((catalog_uri, DCTERMS.description, Literal("A catalog of datasets representing EU export information.", datatype=XSD.string)))
+
+    # Publisher (ensure it's a foaf:Agent)
+    metadata_graph.add((WIKIDATA["Q458"], RDF.type, URIRef("http://xmlns.com/foaf/0.1/Agent")))
+    metadata_graph.add((catalog_uri, DCTERMS.publisher, WIKIDATA["Q458"]))
+
+    metadata_graph.add((catalog_uri, DCAT.dataset, dataset_uri))
+
+    # Add dataset metadata to the metadata graph
+    metadata_graph.add((dataset_uri, RDF.type, DCAT.Dataset))
+    metadata_graph.add((dataset_uri, DCTERMS.title, Literal("EU Export Data for Various Countries", datatype=XSD.string)))
+    metadata_graph.add((dataset_uri, DCTERMS.description, Literal("This dataset contains export data from the European Union to multiple countries, covering 2019-2024.", datatype=XSD.string)))
+    metadata_graph.add((dataset_uri, DCTERMS.creator, WIKIDATA["Q458"]))
+    metadata_graph.add((dataset_uri, DCTERMS.issued, Literal("2024-11-17", datatype=XSD.date)))
+
+    # Temporal (dcterms:temporal must be a PeriodOfTime)
+    temporal_uri = EX["time_period/2019-01_to_2024-12"]
+    metadata_graph.add((temporal_uri, RDF.type, DCTERMS.PeriodOfTime))
+    metadata_graph.add((temporal_uri, SCHEMA.startDate, Literal("2019-01", datatype=XSD.gYearMonth)))
+    metadata_graph.add((temporal_uri, SCHEMA.endDate, Literal("2024-12", datatype=XSD.gYearMonth)))
+    metadata_graph.add((dataset_uri, DCTERMS.temporal, temporal_uri))
+
+    # Spatial (dcterms:spatial must be a Location)
+    metadata_graph.add((WIKIDATA["Q458"], RDF.type, DCTERMS.Location))
+    metadata_graph.add((dataset_uri, DCTERMS.spatial, WIKIDATA["Q458"]))
+
+    # One distribution per published file; the Turtle one is always listed
+    for distribution in DISTRIBUTIONS:
+        path = os.path.join(output_dir, distribution['file'])
+        if distribution['file'] != 'eurostat_data.ttl' and not os.path.exists(path):
+            continue
+        distribution_uri = URIRef(f"https://sanctions.streamlit.app/data/ttl/{distribution['file']}")
+        media_type_uri = URIRef(f"http://purl.org/NET/mediatypes/{distribution['media_type']}")
+        metadata_graph.add((distribution_uri, RDF.type, DCAT.Distribution))
+        metadata_graph.add((distribution_uri, DCTERMS.title, Literal(distribution['title'], datatype=XSD.string)))
+        metadata_graph.add((distribution_uri, DCTERMS.format, media_type_uri))  # Media type
+        metadata_graph.add((distribution_uri, DCAT.accessURL, distribution_uri))
+        if os.path.exists(path):
+            metadata_graph.add((distribution_uri, DCAT.byteSize,
+                                Literal(os.path.getsize(path), datatype=XSD.nonNegativeInteger)))
+        if 'compress' in distribution:
+            compress_uri = URIRef(f"http://purl.org/NET/mediatypes/{distribution['compress']}")
+            metadata_graph.add((distribution_uri, DCAT.compressFormat, compress_uri))
+            metadata_graph.add((compress_uri, RDF.type, DCTERMS.MediaTypeOrExtent))
+        metadata_graph.add((dataset_uri, DCAT.distribution, distribution_uri))
+
+        # Declare the media type as an instance of dcterms:MediaTypeOrExtent
+        metadata_graph.add((media_type_uri, RDF.type, DCTERMS.MediaTypeOrExtent))
+
+    # Add missing foaf:name for European Union
+    metadata_graph.add((WIKIDATA["Q458"], RDF.type, URIRef("http://xmlns.com/foaf/0.1/Agent")))
+    metadata_graph.add((WIKIDATA["Q458"], FOAF.name, Literal("European Union", datatype=XSD.string)))
+
+    license_uri = URIRef("https://creativecommons.org/licenses/by/4.0/")
+    metadata_graph.add((dataset_uri, DCTERMS.license, license_uri))
+
+    return metadata_graph
+
+
+def build_data_graph(combined_df):
+    """In-memory rdflib graph of every observation"""
+    g = Graph()
+    g.bind("ex", EX)
+    g.bind("qb", QB)
+    g.bind("dct", DCTERMS)
+    g.bind("wikidata", WIKIDATA)
+    g.bind("gr", GR)
+    g.bind("dcat", DCAT)
+    g.bind("prov", PROV)
+
+    dataset_uri = EX["dataset/eurostat_exports"]
+    ids = observation_ids(combined_df)
+    # One interned URIRef per distinct label instead of one per row
+    reporters = country_urirefs(combined_df['REPORTER'])
+    partners = country_urirefs(combined_df['PARTNER'])
+    for idx, row in combined_df.iterrows():
+        obs_uri = EX[f'observation{ids[idx]}']
+        g.add((obs_uri, RDF.type, QB.Observation))
+
+        reporter_uri = reporters[idx]
+        partner_uri = partners[idx]
+        flow_uri = URIRef(GR['Sell']) if row['FLOW'] == 'EXPORT' else URIRef(GR['Buy'])  # Use GoodRelations to denote type of action
+
+        g.add((obs_uri, EX.reporter, reporter_uri))
+        g.add((obs_uri, EX.partner, partner_uri))
+        g.add((obs_uri, EX.flow, flow_uri))
+        g.add((dataset_uri, DCAT.hasPart, obs_uri))  # Link dataset to observation
+
+        try:
+            period = pd.to_datetime(row['PERIOD'], errors='coerce').strftime('%Y-%m')
+            if pd.isna(period):
+                raise ValueError(f"Invalid date format for PERIOD: {row['PERIOD']}")
+            g.add((obs_uri, EX.period, Literal(period, datatype=XSD.gYearMonth)))
+        except Exception as e:
+            print(f"Error parsing date: {e}")
+
+        try:
+            value = float(row['VALUE_IN_EUR'])
+            g.add((obs_uri, EX.valueInEUR, Literal(value, datatype=XSD.decimal)))
+        except ValueError:
+            print(f"Invalid VALUE_IN_EUR: {row['VALUE_IN_EUR']}")
+
+    return g
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the RDF Data Cube of EU exports")
+    parser.add_argument('--graph', action='store_true',
+                        help="Build the whole rdflib graph in memory and also write JSON-LD (slow)")
+    parser.add_argument('--format', choices=list(EXTENSIONS), default='turtle',
+                        help="Format of the streamed observations; jsonld writes JSON-LD and NDJSON-LD")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, help="Worker processes for the shards (default: one per CPU)")
+    parser.add_argument('--no-merge', action='store_true',
+                        help=f"Only publish the per-folder shards in <output-dir>/{SHARD_DIR}")
+    parser.add_argument('--force', action='store_true', help="Regenerate every shard, even if its sources are unchanged")
+    parser.add_argument('--all-formats', action='store_true',
+                        help="Publish Turtle, N-Triples (plain and gzip), JSON-LD, NDJSON-LD and the binary .npz")
+    parser.add_argument('--check', action='store_true',
+                        help="Regenerate the Turtle file in a scratch folder and fail if <output-dir> holds another one")
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    if args.check:
+        sys.exit(0 if check_turtle(args.output_dir, args.workers) else 1)
+
+    if args.graph:
+        # Combine all data
+        frames = [load_folder(country, folder_path) for country, folder_path in folders.items()]
+        combined_df = pd.concat([df for df in frames if not df.empty], ignore_index=True)
+        g = build_data_graph(combined_df)
+        g.serialize(destination=f'{args.output_dir}/eurostat_data.ttl', format='turtle')
+        with open(f'{args.output_dir}/eurostat_data.json', 'w', encoding='utf-8') as out:
+            write_jsonld([combined_df], out)
+        forget_merged(args.output_dir, ['eurostat_data.ttl', 'eurostat_data.json'])
+        count = len(combined_df)
+    elif args.all_formats:
+        for style in EXTENSIONS:
+            count = write_sharded(args.output_dir, style, args.workers, force=args.force)
+        for name, seconds in publish(args.output_dir).items():
+            print(f"Wrote {name} in {seconds:.2f}s")
+        record_derived(args.output_dir)
+    else:
+        count = write_sharded(args.output_dir, args.format, args.workers, merge=not args.no_merge, force=args.force)
+
+    # Written last so the distributions are listed with their current size
+    metadata_graph = build_metadata_graph(args.output_dir)
+    metadata_graph.serialize(destination=f'{args.output_dir}/eurostat_metadata.ttl', format='turtle')
+    metadata_graph.serialize(destination=f'{args.output_dir}/eurostat_metadata.json', format='json-ld')
+
+    print(f"{count} observations in {time.perf_counter() - start:.2f}s")
 
-metadata_graph.serialize(destination='data/ttl/eurostat_metadata.ttl', format='turtle')
-metadata_graph.serialize(destination='data/ttl/eurostat_metadata.json', format='json-ld')
 
-g.serialize(destination='data/ttl/eurostat_data.ttl', format='turtle')
-g.serialize(destination='data/ttl/eurostat_data.json', format='json-ld')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
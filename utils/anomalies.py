@@ -0,0 +1,331 @@
+import argparse
+import os
+import time
+import warnings
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.countries import canonical_names
+from utils.eurostat_cache import load_eurostat
+
+YEARLY_FOLDER = 'data/eu_year_export'
+BASELINE_DIR = 'data/cache/anomalies'
+
+# Defaults of the original 2021 -> 2022 analysis on page 4
+MIN_EXPORT_VOLUME = 100000000
+MIN_GROWTH = 50
+Z_THRESHOLD = 1.96
+
+
+def load_yearly_exports(folder_path: str = YEARLY_FOLDER) -> pd.DataFrame:
+    """Annual EU exports to every partner from the Parquet cache"""
+    data = load_eurostat(folder_path)
+    return data[data['MONTH'] == 0]
+
+
+def yearly_pivot(data: pd.DataFrame) -> pd.DataFrame:
+    """PARTNER x YEAR matrix of summed VALUE_IN_EUR, 0 where a partner has no row.
+
+    Partners are keyed by their canonical name, so the French labels of the
+    2016 extract add up with the English ones of the other years.
+    """
+    partner_codes, partners = pd.factorize(canonical_names(data['PARTNER']).astype(str), sort=True)
+    years = data['YEAR'].to_numpy(np.int32)
+    first_year = int(years.min())
+    n_years = int(years.max()) - first_year + 1
+
+    values = np.zeros((len(partners), n_years))
+    np.add.at(values, (partner_codes, years - first_year), data['VALUE_IN_EUR'].fillna(0).to_numpy())
+
+    # Years nobody reported (gaps in the extract) are dropped like in a pivot_table
+    reported = np.bincount(years - first_year, minlength=n_years) > 0
+    columns = np.arange(first_year, first_year + n_years)[reported]
+    return pd.DataFrame(values[:, reported], index=pd.Index(partners, name='PARTNER'), columns=columns)
+
+
+def growth_column(year: int) -> str:
+    """Name of the growth column ending in a year ('GROWTH_2021_2022')"""
+    return f'GROWTH_{year - 1}_{year}'
+
+
+def growth_rates(pivot: pd.DataFrame) -> pd.DataFrame:
+    """Year-over-year growth in percent; NaN where the previous year is 0"""
+    values = pivot.to_numpy(dtype=float)
+    previous = values[:, :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(previous != 0, (values[:, 1:] - previous) / previous * 100, np.nan)
+    return pd.DataFrame(growth, index=pivot.index, columns=[growth_column(y) for y in pivot.columns[1:]])
+
+
+def scan_anomalies(pivot: pd.DataFrame, window: Optional[int] = None,
+                   min_volume: float = MIN_EXPORT_VOLUME, min_growth: float = MIN_GROWTH,
+                   z_threshold: float = Z_THRESHOLD) -> pd.DataFrame:
+    """Z-score of the growth into every year against the growth rates before it.
+
+    The baseline of a target year is the mean and sample standard deviation of
+    the `window` growth rates preceding it (all earlier ones when None). All
+    partners and target years are scored at once through a sliding window over
+    the growth matrix. Returns one row per partner and target year with an
+    ANOMALY flag for z > z_threshold, growth > min_growth and a target year
+    volume above min_volume.
+    """
+    growth = growth_rates(pivot).to_numpy()
+    n_partners, n_growth = growth.shape
+    width = n_growth if window is None else window
+
+    # baseline[p, t] holds the `width` growth rates before growth t, NaN-padded on the left
+    padded = np.concatenate([np.full((n_partners, width), np.nan), growth[:, :-1]], axis=1)
+    baseline = sliding_window_view(padded, width, axis=1)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # partners without enough history
+        mean = np.nanmean(baseline, axis=2)
+        std = np.nanstd(baseline, axis=2, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_score = (growth - mean) / std
+    z_score[~np.isfinite(z_score)] = np.nan
+
+    years = pivot.columns[1:].to_numpy()
+    values = pivot.to_numpy(dtype=float)
+    scan = pd.DataFrame({
+        'PARTNER': np.repeat(pivot.index.to_numpy(), n_growth),
+        'YEAR': np.tile(years, n_partners),
+        'VALUE_IN_EUR': values[:, 1:].ravel(),
+        'GROWTH': growth.ravel(),
+        'MEAN_PREV_GROWTH': mean.ravel(),
+        'STD_PREV_GROWTH': std.ravel(),
+        'Z_SCORE': z_score.ravel(),
+    })
+    scan['ANOMALY'] = (
+        (scan['Z_SCORE'] > z_threshold)
+        & (scan['GROWTH'] > min_growth)
+        & (scan['VALUE_IN_EUR'] > min_volume)
+    )
+    return scan
+
+
+def anomalous_partners(scan: pd.DataFrame, years: Optional[List[int]] = None) -> pd.DataFrame:
+    """Flagged partner-years, strongest Z-score first"""
+    flagged = scan[scan['ANOMALY']]
+    if years is not None:
+        flagged = flagged[flagged['YEAR'].isin(years)]
+    return flagged.sort_values('Z_SCORE', ascending=False, kind='stable')
+
+
+def anomaly_table(pivot: pd.DataFrame, scan: pd.DataFrame, year: int, history: int = 3) -> pd.DataFrame:
+    """Wide table of the partners flagged in a year: yearly values, the last growth rates and the baseline"""
+    flagged = anomalous_partners(scan, [year]).set_index('PARTNER')
+    growth = growth_rates(pivot)
+    growth_columns = [growth_column(y) for y in range(year - history + 1, year + 1) if growth_column(y) in growth]
+    z_column = f'Z_SCORE_{year - 1}_{year}'
+
+    table = pd.concat([
+        pivot.loc[flagged.index, [y for y in pivot.columns if y <= year]],
+        growth.loc[flagged.index, growth_columns],
+        flagged[['MEAN_PREV_GROWTH', 'STD_PREV_GROWTH', 'Z_SCORE']].rename(columns={'Z_SCORE': z_column}),
+    ], axis=1)
+    return table.reset_index()
+
+
+class BaselineAccumulator:
+    """Per-partner running baseline of growth rates, updated one period at a time.
+
+    Keeps Welford accumulators (count, mean, sum of squared deviations) of the
+    growth rates seen so far, plus a ring buffer of the last `window` rates so
+    a rolling baseline can drop its oldest rate. Appending a period scores it
+    against the baseline before it, exactly like scan_anomalies, and then
+    folds its growth in, at O(partners) cost.
+    """
+
+    def __init__(self, partners: List[str], window: Optional[int] = None):
+        self.window = window
+        self.partners = list(partners)
+        self.last_period: Optional[int] = None
+        self.last_values = np.zeros(len(self.partners))
+        self.count = np.zeros(len(self.partners), dtype=np.int64)
+        self.mean = np.zeros(len(self.partners))
+        self.m2 = np.zeros(len(self.partners))
+        self.ring = np.full((len(self.partners), window or 0), np.nan)
+        self.position = 0
+        self._rows = {partner: i for i, partner in enumerate(self.partners)}
+
+    @property
+    def std(self) -> np.ndarray:
+        """Sample standard deviation of the baseline, NaN below two rates"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+    def _add_partners(self, partners):
+        new = [partner for partner in partners if partner not in self._rows]
+        if not new:
+            return
+        for partner in new:
+            self._rows[partner] = len(self.partners)
+            self.partners.append(partner)
+        pad = len(new)
+        self.last_values = np.concatenate([self.last_values, np.zeros(pad)])
+        self.count = np.concatenate([self.count, np.zeros(pad, dtype=np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros(pad)])
+        self.m2 = np.concatenate([self.m2, np.zeros(pad)])
+        self.ring = np.concatenate([self.ring, np.full((pad, self.ring.shape[1]), np.nan)])
+
+    def _push(self, growth: np.ndarray):
+        present = ~np.isnan(growth)
+        x = np.where(present, growth, 0.0)
+        self.count += present
+        delta = np.where(present, x - self.mean, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mean += np.where(present, delta / np.maximum(self.count, 1), 0.0)
+        self.m2 += np.where(present, delta * (x - self.mean), 0.0)
+
+    def _pop(self, growth: np.ndarray):
+        present = ~np.isnan(growth)
+        x = np.where(present, growth, 0.0)
+        self.count -= present
+        delta = np.where(present, x - self.mean, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mean -= np.where(present & (self.count > 0), delta / np.maximum(self.count, 1), 0.0)
+        self.m2 -= np.where(present, delta * (x - self.mean), 0.0)
+        # An emptied baseline starts from exact zeros again
+        empty = self.count == 0
+        self.mean[empty] = 0.0
+        self.m2[empty] = 0.0
+
+    def append(self, period: int, values: pd.Series) -> pd.DataFrame:
+        """Score the VALUE_IN_EUR of a new period (partner-indexed) and add its growth to the baseline"""
+        if self.last_period is not None and period <= self.last_period:
+            raise ValueError(f"Period {period} is not after the last appended period {self.last_period}")
+        self._add_partners(values.index)
+        current = np.zeros(len(self.partners))
+        current[[self._rows[partner] for partner in values.index]] = values.fillna(0).to_numpy()
+
+        first = self.last_period is None
+        previous = self.last_values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.where(previous != 0, (current - previous) / previous * 100, np.nan)
+            if first:
+                growth[:] = np.nan
+            mean = np.where(self.count > 0, self.mean, np.nan)
+            std = self.std
+            z_score = (growth - mean) / std
+        z_score[~np.isfinite(z_score)] = np.nan
+
+        scored = pd.DataFrame({
+            'PARTNER': self.partners,
+            'YEAR': period,
+            'VALUE_IN_EUR': current,
+            'GROWTH': growth,
+            'MEAN_PREV_GROWTH': mean,
+            'STD_PREV_GROWTH': std,
+            'Z_SCORE': z_score,
+        })
+
+        if not first:
+            if self.window:
+                self._pop(self.ring[:, self.position])
+                self.ring[:, self.position] = growth
+                self.position = (self.position + 1) % self.window
+            self._push(growth)
+        self.last_period = period
+        self.last_values = current
+        return scored
+
+    @classmethod
+    def from_pivot(cls, pivot: pd.DataFrame, window: Optional[int] = None) -> 'BaselineAccumulator':
+        """Accumulate every year of a PARTNER x YEAR matrix"""
+        accumulator = cls(pivot.index.astype(str), window)
+        for year in pivot.columns:
+            accumulator.append(int(year), pivot[year])
+        return accumulator
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            window=self.window or 0,
+            partners=np.array(self.partners, dtype=str),
+            last_period=-1 if self.last_period is None else self.last_period,
+            last_values=self.last_values,
+            count=self.count,
+            mean=self.mean,
+            m2=self.m2,
+            ring=self.ring,
+            position=self.position,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BaselineAccumulator':
+        with np.load(path) as stored:
+            accumulator = cls(stored['partners'].tolist(), int(stored['window']) or None)
+            last_period = int(stored['last_period'])
+            accumulator.last_period = None if last_period < 0 else last_period
+            accumulator.last_values = stored['last_values']
+            accumulator.count = stored['count']
+            accumulator.mean = stored['mean']
+            accumulator.m2 = stored['m2']
+            accumulator.ring = stored['ring']
+            accumulator.position = int(stored['position'])
+        return accumulator
+
+
+def baseline_path(window: Optional[int] = None) -> str:
+    name = f'rolling-{window}' if window else 'expanding'
+    return os.path.join(BASELINE_DIR, f'baseline-{name}.npz')
+
+
+def update_baseline(pivot: pd.DataFrame, window: Optional[int] = None,
+                    min_volume: float = MIN_EXPORT_VOLUME, min_growth: float = MIN_GROWTH,
+                    z_threshold: float = Z_THRESHOLD) -> pd.DataFrame:
+    """Append the years of a pivot newer than the stored baseline and return their scores"""
+    path = baseline_path(window)
+    accumulator = BaselineAccumulator.load(path) if os.path.exists(path) else BaselineAccumulator([], window)
+    new_years = [int(year) for year in pivot.columns
+                 if accumulator.last_period is None or year > accumulator.last_period]
+
+    scored = [accumulator.append(year, pivot[year]) for year in new_years]
+    accumulator.save(path)
+    if not scored:
+        return pd.DataFrame(columns=['PARTNER', 'YEAR', 'VALUE_IN_EUR', 'GROWTH', 'MEAN_PREV_GROWTH',
+                                     'STD_PREV_GROWTH', 'Z_SCORE', 'ANOMALY'])
+
+    scan = pd.concat(scored, ignore_index=True)
+    scan['ANOMALY'] = (
+        (scan['Z_SCORE'] > z_threshold)
+        & (scan['GROWTH'] > min_growth)
+        & (scan['VALUE_IN_EUR'] > min_volume)
+    )
+    return scan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan every partner and year for anomalous EU export growth")
+    parser.add_argument('--years', type=int, nargs='*', help="Target years to report (default: all)")
+    parser.add_argument('--window', type=int, help="Number of earlier growth rates in the baseline (default: all)")
+    parser.add_argument('--min-volume', type=float, default=MIN_EXPORT_VOLUME)
+    parser.add_argument('--min-growth', type=float, default=MIN_GROWTH)
+    parser.add_argument('--z-threshold', type=float, default=Z_THRESHOLD)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only score years newer than the stored baseline in " + BASELINE_DIR)
+    args = parser.parse_args()
+
+    pivot = yearly_pivot(load_yearly_exports())
+    start = time.perf_counter()
+    if args.incremental:
+        scan = update_baseline(pivot, args.window, args.min_volume, args.min_growth, args.z_threshold)
+    else:
+        scan = scan_anomalies(pivot, args.window, args.min_volume, args.min_growth, args.z_threshold)
+    elapsed = time.perf_counter() - start
+
+    flagged = anomalous_partners(scan, args.years)
+    print(flagged[['YEAR', 'PARTNER', 'VALUE_IN_EUR', 'GROWTH', 'Z_SCORE']].round(2).to_string(index=False))
+    print(f"{pivot.shape[0]} partners x {scan['YEAR'].nunique()} years scanned in {elapsed * 1000:.1f} ms, "
+          f"{len(flagged)} anomalies")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,28 +4,11 @@ from pathlib import Path
 from typing import Dict, List
 import logging
 
+from utils.converter_core import convert_national_table, print_unmapped
+
 class ArmeniaDataConverter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        
-        self.exchange_rates = {
-            2019: 1.12,
-            2020: 1.14,
-            2021: 1.18,
-            2022: 1.05,
-            2023: 1.07
-        }
-
-        self.country_mapping = {
-            "EU": "European Union - 27 countries (from 2020)",
-            "European Union": "European Union - 27 countries (from 2020)",
-            "Total": "World",
-            "CIS": "Commonwealth of Independent States",
-            "EAEU": "Eurasian Economic Union",
-            "Russian Federation": "Russia",
-            "USA": "United States",
-            "UK": "United Kingdom"
-        }
 
     def read_armenia_data(self, file_path: str) -> pd.DataFrame:
         """Read and initially process Armenia CSV file"""
@@ -69,74 +52,12 @@ class ArmeniaDataConverter:
     def convert_to_eurostat_format(self, df: pd.DataFrame) -> pd.DataFrame:
         """Convert Armenia data to Eurostat format with yearly periods"""
         try:
-            eurostat_data = []
-            unmapped_countries = set()
-            
-            # Define EU-27 countries
-            eu27_countries = {
-                "Austria", "Belgium", "Bulgaria", "Croatia", "Cyprus", 
-                "Czechia", "Czech Republic", "Denmark", "Estonia", "Finland",
-                "France", "Germany", "Greece", "Hungary", "Ireland", "Italy",
-                "Latvia", "Lithuania", "Luxembourg", "Malta", "Netherlands",
-                "Poland", "Portugal", "Romania", "Slovakia", "Slovenia",
-                "Spain", "Sweden"
-            }
-            
-            # Dictionary to store EU-27 totals by year
-            eu27_totals = {}
-            
-            for _, row in df.iterrows():
-                country = str(row['country']).strip()
-                year = int(row['year'])
-                import_value = row['import_consigment']
-                
-                if pd.isna(import_value):
-                    continue
-                
-                # Convert thousand USD to EUR (multiply by 1000 since values are in thousands)
-                value_eur = (float(import_value) * 1000) / self.exchange_rates.get(year, 1.0)
-                
-                # Accumulate EU-27 totals
-                if country in eu27_countries:
-                    eu27_totals[year] = eu27_totals.get(year, 0) + value_eur
-                
-                # Map partner names
-                partner = self.country_mapping.get(country, country)
-                
-                if country not in self.country_mapping and country not in eu27_countries:
-                    unmapped_countries.add(country)
-                
-                eurostat_data.append({
-                    'REPORTER': 'Armenia',
-                    'PARTNER': partner,
-                    'PRODUCT': 'TOTAL',
-                    'FLOW': 'IMPORT',
-                    'STAT_PROCEDURE': 'NORMAL',
-                    'PERIOD': f'Y{year}',
-                    'VALUE_IN_EUR': round(value_eur, 2)
-                })
-            
-            # Add EU-27 total rows
-            for year, total in eu27_totals.items():
-                eurostat_data.append({
-                    'REPORTER': 'Armenia',
-                    'PARTNER': 'European Union - 27 countries (from 2020)',
-                    'PRODUCT': 'TOTAL',
-                    'FLOW': 'IMPORT',
-                    'STAT_PROCEDURE': 'NORMAL',
-                    'PERIOD': f'Y{year}',
-                    'VALUE_IN_EUR': round(total, 2)
-                })
-            
-            if unmapped_countries:
-                print("\nWarning: Found countries without explicit mapping:")
-                print(sorted(unmapped_countries))
-                print("These will be used as-is. Please verify if they match Eurostat naming conventions.")
-            
-            eurostat_df = pd.DataFrame(eurostat_data)
-            
-            if not eurostat_df.empty:
-                eurostat_df = eurostat_df.sort_values(['PERIOD', 'PARTNER'])
+            # EU-27 totals by year are appended to the partner rows
+            eurostat_df, unmapped_countries = convert_national_table(
+                df['country'], df['year'], df['import_consigment'], 'Armenia',
+                eu27_total=True
+            )
+            print_unmapped(unmapped_countries)
             
             return eurostat_df
             
@@ -0,0 +1,49 @@
+from typing import Dict
+
+import pandas as pd
+
+# Time bins offered by the charts, as pandas period frequencies
+BINS: Dict[str, str] = {'Monthly': 'M', 'Quarterly': 'Q', 'Yearly': 'Y'}
+
+# Reporters drawn separately by default; the rest are summed into OTHER
+TOP_K = 8
+OTHER = 'Other'
+
+
+def bin_start(periods: pd.Series, freq: str) -> pd.Series:
+    """First day of the month, quarter or year every timestamp falls in"""
+    return periods.dt.to_period(freq).dt.start_time
+
+
+def binned(df: pd.DataFrame, period: str, value: str, by: str) -> pd.DataFrame:
+    """The frame summed per group for every bin, with a BIN column naming the frequency"""
+    frames = []
+    for freq in BINS.values():
+        sums = df.groupby([bin_start(df[period], freq), df[by]], sort=True, observed=True)[value].sum()
+        sums = sums.reset_index()
+        sums.insert(0, 'BIN', freq)
+        frames.append(sums)
+    return pd.concat(frames, ignore_index=True)
+
+
+def reporter_ranks(df: pd.DataFrame) -> pd.DataFrame:
+    """REPORTER, TOTAL and RANK (0 = largest) of the reporters of a frame, over the whole period"""
+    totals = df.groupby('REPORTER')['VALUE_IN_EUR'].sum().sort_values(ascending=False, kind='stable')
+    return pd.DataFrame({'REPORTER': totals.index, 'TOTAL': totals.to_numpy(), 'RANK': range(len(totals))})
+
+
+def top_k_reporters(df: pd.DataFrame, ranks: pd.DataFrame, top_k: int = TOP_K) -> pd.DataFrame:
+    """Binned reporter values with every reporter below the top k summed into OTHER.
+
+    Rows come largest reporter first and OTHER last, so the stacked bars and
+    the legend keep that order.
+    """
+    rank = df['REPORTER'].map(ranks.set_index('REPORTER')['RANK'])
+    reporter = df['REPORTER'].where(rank < top_k, OTHER)
+    order = list(ranks.loc[ranks['RANK'] < top_k, 'REPORTER']) + ([OTHER] if (rank >= top_k).any() else [])
+    reporters = pd.Categorical(reporter, categories=order)
+    result = (df.assign(REPORTER=reporters)
+              .groupby(['REPORTER', 'PERIOD'], observed=True)['VALUE_IN_EUR'].sum()
+              .reset_index())
+    result['REPORTER'] = result['REPORTER'].astype(str)
+    return result
@@ -2,13 +2,11 @@ import pandas as pd
 import glob
 from pathlib import Path
 
-def convert_period_format(period: str) -> str:
-    """Convert period from '202408-Aug. 2024' to 'Aug. 2024' format"""
-    try:
-        # Split on the hyphen and take the second part
-        return period.split('-')[1]
-    except:
-        return period
+from utils.periods import eurostat_labels
+
+def convert_period_format(periods: pd.Series) -> pd.Series:
+    """Convert periods from '202408-Aug. 2024' to 'Aug. 2024' format"""
+    return eurostat_labels(periods)
 
 def process_file(file_path: str, output_path: str):
     """Process a single file and save with converted dates"""
@@ -17,7 +15,7 @@ def process_file(file_path: str, output_path: str):
         df = pd.read_csv(file_path)
         
         # Convert PERIOD column
-        df['PERIOD'] = df['PERIOD'].apply(convert_period_format)
+        df['PERIOD'] = convert_period_format(df['PERIOD'])
         
         # Save processed file
         print(f"Saving to: {output_path}")
@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from utils.arm import ArmeniaDataConverter
+from utils.countries import REGISTRY_PATH
+from utils.fx import FX_PATH
+from utils.kaz import KazakhstanDataConverter
+from utils.kyr import KyrgyzDataConverter
+from utils.uzb import UzbekDataConverter
+from utils.workbook_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = 'data/national_data_converted'
+SOURCE_NAMES = ['kazakhstan', 'kyrgyzstan', 'armenia', 'uzbekistan']
+
+# Files every conversion reads besides its own inputs
+SHARED_INPUTS = [FX_PATH, REGISTRY_PATH]
+
+# Content hashes of every output and of the inputs it was built from, tracked with the outputs
+# so that a fresh checkout, whose files all have the checkout time, knows what is up to date
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, 'sources.json')
+
+
+def load_manifest() -> Dict:
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest: Dict):
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+@dataclass
+class NationalSource:
+    """One national statistics source: the files to read and the CSV they produce"""
+    name: str
+    converter: Callable
+    output: str
+    inputs: List[Tuple] = field(default_factory=list)  # read_input arguments after the source name
+
+    @property
+    def output_path(self) -> str:
+        return os.path.join(OUTPUT_DIR, self.output)
+
+    def input_digests(self) -> Dict[str, str]:
+        """sha256 of every input and of the shared FX and country tables"""
+        return {path: file_digest(path) for path in [args[0] for args in self.inputs] + SHARED_INPUTS}
+
+    def is_stale(self, manifest: Dict) -> bool:
+        """True when the output is missing, was changed since it was written or was built from other inputs"""
+        entry = manifest.get(self.name)
+        if entry is None or not os.path.exists(self.output_path):
+            return True
+        return file_digest(self.output_path) != entry['output'] or self.input_digests() != entry['inputs']
+
+
+def national_sources() -> Dict[str, NationalSource]:
+    """Every national converter with its input files"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        kazakhstan_files = KazakhstanDataConverter().list_input_files('data/kazakhstan_data')
+    return {
+        'kazakhstan': NationalSource('kazakhstan', KazakhstanDataConverter, 'kazakhstan_import_yearly.csv',
+                                     kazakhstan_files),
+        'kyrgyzstan': NationalSource('kyrgyzstan', KyrgyzDataConverter, 'kyrgyz_import_yearly.csv', [(
+            "data/kyrgyzstan_data/4.03.00.20 Географическое распределение импорта товаров..xlsx",)]),
+        'armenia': NationalSource('armenia', ArmeniaDataConverter, 'armenia_import_yearly.csv',
+                                  [('data/armenia_data/armenia_data.csv',)]),
+        'uzbekistan': NationalSource('uzbekistan', UzbekDataConverter, 'uzbek_import_yearly.csv',
+                                     [('data/uzbekistan_data/sdmx_data_1176.csv',)]),
+    }
+
+
+def read_input(name: str, *args) -> Tuple[pd.DataFrame, float, str]:
+    """Read one input file of a source in a worker; returns the frame, seconds and captured output"""
+    start = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if name == 'kazakhstan':
+            df = KazakhstanDataConverter().read_kazakhstan_file(*args)
+        elif name == 'kyrgyzstan':
+            df = KyrgyzDataConverter().read_kyrgyz_data(*args)
+        elif name == 'armenia':
+            df = ArmeniaDataConverter().read_armenia_data(*args)
+        elif name == 'uzbekistan':
+            df = UzbekDataConverter().read_uzbek_data(*args)
+        else:
+            raise ValueError(f"Unknown national source: {name}")
+    return df, time.perf_counter() - start, output.getvalue()
+
+
+def write_output(source: NationalSource, frames: List[pd.DataFrame], verbose: bool = False) -> int:
+    """Convert the frames read for a source and save its CSV; returns the number of rows"""
+    converter = source.converter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        eurostat_df = converter.convert_to_eurostat_format(pd.concat(frames, ignore_index=True))
+        converter.save_output(eurostat_df, source.output_path)
+    if verbose:
+        print(output.getvalue())
+    return len(eurostat_df)
+
+
+def run(names: List[str], workers: int = None, force: bool = False, verbose: bool = False) -> Dict[str, int]:
+    """Read every input file in a process pool and write each source as soon as all its files are in"""
+    sources = national_sources()
+    selected = [sources[name] for name in names]
+    manifest = load_manifest()
+    todo = [source for source in selected if force or source.is_stale(manifest)]
+    for source in selected:
+        if source not in todo:
+            print(f"{source.name}: {source.output_path} is up to date")
+
+    written = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for source in todo:
+            for args in source.inputs:
+                futures[pool.submit(read_input, source.name, *args)] = (source, args)
+
+        # Frames are kept in input order so the converted rows come out in the usual order
+        frames = {source.name: [None] * len(source.inputs) for source in todo}
+        pending = {source.name: len(source.inputs) for source in todo}
+        failed = set()
+        for future in as_completed(futures):
+            source, args = futures[future]
+            try:
+                df, seconds, output = future.result()
+            except Exception as e:
+                logger.error(f"Error reading {args[0]}: {e}")
+                print(f"{source.name}: failed to read {args[0]}: {e}")
+                failed.add(source.name)
+            else:
+                if verbose:
+                    print(output)
+                print(f"{source.name}: read {os.path.basename(args[0])} in {seconds:.2f}s")
+                frames[source.name][source.inputs.index(args)] = df
+
+            pending[source.name] -= 1
+            if pending[source.name] > 0:
+                continue
+            # The output depends on every input of its source; a partial read keeps the old CSV
+            if source.name in failed:
+                print(f"{source.name}: not written, {source.output_path} left unchanged")
+                continue
+            step = time.perf_counter()
+            written[source.name] = write_output(source, frames[source.name], verbose)
+            manifest[source.name] = {'output': file_digest(source.output_path), 'inputs': source.input_digests()}
+            save_manifest(manifest)
+            print(f"{source.name}: wrote {written[source.name]} rows to {source.output_path} "
+                  f"in {time.perf_counter() - step:.2f}s")
+
+    print(f"Converted {len(written)} of {len(todo)} sources in {time.perf_counter() - start:.2f}s")
+    return written
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert all national statistics to the Eurostat format")
+    parser.add_argument('sources', nargs='*', help=f"Sources to convert: {', '.join(SOURCE_NAMES)} (default: all)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true', help="Convert even if the output is up to date")
+    parser.add_argument('--verbose', action='store_true', help="Show the converters' own output")
+    args = parser.parse_args()
+    unknown = set(args.sources) - set(SOURCE_NAMES)
+    if unknown:
+        parser.error(f"unknown sources: {', '.join(sorted(unknown))}")
+    run(args.sources or SOURCE_NAMES, args.workers, args.force, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
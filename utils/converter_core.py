@@ -0,0 +1,112 @@
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.countries import canonical_names, country_registry
+from utils.fx import usd_to_eur
+
+EU27_PARTNER = 'European Union - 27 countries (from 2020)'
+
+OUTPUT_COLUMNS = ['REPORTER', 'PARTNER', 'PRODUCT', 'FLOW', 'STAT_PROCEDURE', 'PERIOD', 'VALUE_IN_EUR']
+
+# Basic Cyrillic letters А..я, i.e. a partner name that was never translated
+CYRILLIC_PATTERN = r'[А-я]'
+
+
+def clean_labels(values: pd.Series) -> pd.Series:
+    """Country names as stripped strings, 'nan' for missing ones (like str(value).strip())"""
+    labels = values.astype(object)
+    return labels.where(labels.notna(), 'nan').astype(str).str.strip()
+
+
+def round_values(values: np.ndarray) -> np.ndarray:
+    """Round to cents exactly like the builtin round(); np.round can differ on ties"""
+    return np.fromiter((round(value, 2) for value in values.tolist()), dtype=float, count=len(values))
+
+
+def usd_thousands_to_eur(values: pd.Series, years: pd.Series, months: Optional[pd.Series] = None) -> np.ndarray:
+    """Convert thousand USD to EUR at the average USD per EUR rate of each row's month or year.
+
+    Raises KeyError for periods data/fx_usd_eur.csv has no rate for.
+    """
+    return usd_to_eur(values.to_numpy(dtype=float) * 1000, years.to_numpy(),
+                      None if months is None else months.to_numpy())
+
+
+def wide_to_long(df: pd.DataFrame, country_column: str, year_columns: List[str]) -> pd.DataFrame:
+    """Year-major (country, year, value) rows of a table with one column per year"""
+    values = df[year_columns].to_numpy(dtype=float)
+    return pd.DataFrame({
+        'country': np.tile(df[country_column].to_numpy(dtype=object), len(year_columns)),
+        'year': np.repeat([int(year) for year in year_columns], len(df)),
+        'value': values.T.ravel(),
+    })
+
+
+def convert_national_table(countries: pd.Series, years: pd.Series, values: pd.Series, reporter: str,
+                           eu27_total: bool = False, exclude: Iterable[str] = (),
+                           skip_cyrillic: bool = False) -> Tuple[pd.DataFrame, Set[str]]:
+    """Convert national import rows (partner, year, thousand USD) to the Eurostat format.
+
+    Rows without a value or partner name and excluded partners are dropped.
+    Partners are resolved to their canonical names through the country
+    registry, and with skip_cyrillic unknown Cyrillic names are dropped. With
+    eu27_total, a per-year EU-27 total row is appended, summed in input order
+    over the partners data/countries.csv flags as EU members. Returns the output sorted by PERIOD and PARTNER, plus the
+    partner names the registry does not know.
+    """
+    countries = clean_labels(countries.reset_index(drop=True))
+    years = years.reset_index(drop=True).astype(int)
+    values = values.reset_index(drop=True)
+
+    keep = values.notna() & (countries.str.lower() != 'nan') & ~countries.isin(list(exclude))
+    registry = country_registry()
+    registry_rows = registry.rows(countries)
+    mapped = pd.Series(registry_rows >= 0, index=countries.index)
+    if skip_cyrillic:
+        cyrillic = ~mapped & countries.str.contains(CYRILLIC_PATTERN, regex=True)
+        unmapped = set(countries[keep & cyrillic])
+        keep &= ~cyrillic
+    else:
+        unmapped = set(countries[keep & ~mapped])
+
+    countries, years = countries[keep], years[keep]
+    registry_rows = registry_rows[keep.to_numpy()]
+    value_eur = usd_thousands_to_eur(values[keep], years)
+    partners = canonical_names(countries)
+    periods = 'Y' + years.astype(str)
+
+    rows = [pd.DataFrame({'PARTNER': partners.to_numpy(), 'PERIOD': periods.to_numpy(),
+                          'VALUE_IN_EUR': round_values(value_eur)})]
+
+    if eu27_total:
+        eu27 = np.append(registry.entries['eu27'].to_numpy() == 'yes', False)  # row -1 is no member
+        member = eu27[registry_rows]
+        codes, eu_years = pd.factorize(years[member])
+        totals = np.zeros(len(eu_years))
+        np.add.at(totals, codes, value_eur[member])  # sequential, like a running sum per year
+        rows.append(pd.DataFrame({'PARTNER': EU27_PARTNER, 'PERIOD': [f'Y{year}' for year in eu_years],
+                                  'VALUE_IN_EUR': round_values(totals)}))
+
+    eurostat_df = pd.concat(rows, ignore_index=True)
+    if eurostat_df.empty:
+        return pd.DataFrame(), unmapped
+
+    eurostat_df['REPORTER'] = reporter
+    eurostat_df['PRODUCT'] = 'TOTAL'
+    eurostat_df['FLOW'] = 'IMPORT'
+    eurostat_df['STAT_PROCEDURE'] = 'NORMAL'
+    eurostat_df = eurostat_df[OUTPUT_COLUMNS].sort_values(['PERIOD', 'PARTNER'])
+    return eurostat_df, unmapped
+
+
+def print_unmapped(unmapped_countries: Set[str], dropped: bool = False):
+    """Warn about partner names the registry does not know, used as-is or dropped"""
+    if unmapped_countries:
+        print("\nWarning: Found countries missing from data/countries.csv:")
+        print(sorted(unmapped_countries))
+        if dropped:
+            print("Their rows were dropped. Add them to data/countries.csv to keep them.")
+        else:
+            print("These will be used as-is. Please verify if they match Eurostat naming conventions.")
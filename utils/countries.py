@@ -0,0 +1,149 @@
+import difflib
+import re
+import unicodedata
+import urllib.parse
+from functools import lru_cache
+from typing import Callable, Dict, Set
+
+import numpy as np
+import pandas as pd
+from rdflib import URIRef
+
+WIKIDATA = "http://www.wikidata.org/entity/"
+COUNTRY_NAMESPACE = "https://sanctions.streamlit.app/ns#country/"
+
+REGISTRY_PATH = 'data/countries.csv'
+LANGUAGES = ['en', 'fr', 'ru', 'ky']
+ALIAS_SEPARATOR = ';'
+
+# Minimum difflib ratio for a label the alias index does not know
+FUZZY_CUTOFF = 0.88
+
+PARENTHESES = re.compile(r'\([^()]*\)')
+NOT_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+
+def normalize(label: str, drop_parentheses: bool = False) -> str:
+    """Lookup key of a label: accents folded, case folded, punctuation collapsed to single spaces"""
+    if drop_parentheses:
+        # Innermost first, so nested notes like "(incl. Navassa Island (part of 'UM'))" go too
+        while True:
+            stripped = PARENTHESES.sub(' ', label)
+            if stripped == label:
+                break
+            label = stripped
+    folded = ''.join(char for char in unicodedata.normalize('NFKD', label) if not unicodedata.combining(char))
+    return NOT_ALPHANUMERIC.sub(' ', folded.casefold()).strip()
+
+
+class CountryRegistry:
+    """Canonical countries and aggregates with ISO codes, Wikidata IDs and EN/FR/RU/KY aliases.
+
+    Every name and alias is indexed under its normalized key, and once more
+    without parenthetical notes unless that short key is ambiguous, so
+    Eurostat labels like "Germany (incl. German Democratic Republic 'DD'
+    from 1991)" resolve without being listed. Labels the index misses are
+    matched fuzzily against the keys, once per distinct label.
+    """
+
+    def __init__(self, entries: pd.DataFrame):
+        self.entries = entries.reset_index(drop=True)
+        self.keys: Dict[str, int] = {}
+        short_keys: Dict[str, Set[int]] = {}
+        for row, entry in enumerate(self.entries.itertuples(index=False)):
+            names = [entry.name] + [alias for language in LANGUAGES
+                                    for alias in getattr(entry, language).split(ALIAS_SEPARATOR) if alias]
+            for name in names:
+                key = normalize(name)
+                if self.keys.setdefault(key, row) != row:
+                    raise ValueError(f"Alias {name!r} of {entry.name!r} already names "
+                                     f"{self.entries.at[self.keys[key], 'name']!r}")
+                short_keys.setdefault(normalize(name, drop_parentheses=True), set()).add(row)
+        self.short_keys = {key: rows.pop() for key, rows in short_keys.items()
+                           if len(rows) == 1 and key not in self.keys}
+        self._choices = list(self.keys)
+        self._resolved: Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, path: str = REGISTRY_PATH) -> 'CountryRegistry':
+        return cls(pd.read_csv(path, dtype=str, keep_default_na=False))
+
+    def lookup(self, label: str) -> int:
+        """Registry row of a label, -1 when it names nothing known"""
+        if label not in self._resolved:
+            self._resolved[label] = self._match(label)
+        return self._resolved[label]
+
+    def _match(self, label: str) -> int:
+        key = normalize(label)
+        if key in self.keys:
+            return self.keys[key]
+        short_key = normalize(label, drop_parentheses=True)
+        for index in (self.keys, self.short_keys):
+            if short_key in index:
+                return index[short_key]
+        close = difflib.get_close_matches(key, self._choices, n=1, cutoff=FUZZY_CUTOFF)
+        return self.keys[close[0]] if close else -1
+
+    def rows(self, values: pd.Series) -> np.ndarray:
+        """Registry row of every label in a column (-1 for unknown or missing), looked up once per label"""
+        codes, uniques = pd.factorize(values)
+        rows = np.fromiter((self.lookup(str(label)) for label in uniques), dtype=np.int64, count=len(uniques))
+        return np.append(rows, -1)[codes]
+
+    def column(self, values: pd.Series, field: str) -> pd.Series:
+        """A registry field for every label, the label itself where the registry has no entry"""
+        rows = self.rows(values)
+        known = rows >= 0
+        result = values.astype(object).to_numpy(copy=True)
+        result[known] = self.entries[field].to_numpy(dtype=object)[rows[known]]
+        return pd.Series(result, index=values.index, dtype=object)
+
+
+@lru_cache(maxsize=None)
+def country_registry() -> CountryRegistry:
+    """The registry of data/countries.csv, loaded once per process"""
+    return CountryRegistry.load()
+
+
+def canonical_names(values: pd.Series) -> pd.Series:
+    """Canonical name of every label; labels the registry does not know are kept as they are"""
+    return country_registry().column(values, 'name')
+
+
+@lru_cache(maxsize=None)
+def country_iri(country_name: str) -> str:
+    """IRI of a reporter or partner label: its Wikidata entity, or an ex:country/ fallback"""
+    registry = country_registry()
+    row = registry.lookup(country_name)
+    if row >= 0:
+        entry = registry.entries.iloc[row]
+        if entry['wikidata']:
+            return WIKIDATA + entry['wikidata']
+        country_name = entry['name']
+    return COUNTRY_NAMESPACE + urllib.parse.quote(country_name.replace(' ', '_'))
+
+
+@lru_cache(maxsize=None)
+def country_uriref(country_name: str) -> URIRef:
+    """Interned URIRef of a label: the same object for every row that carries it"""
+    return URIRef(country_iri(country_name))
+
+
+def resolve_column(values: pd.Series, resolver: Callable, missing=None) -> pd.Series:
+    """Apply a per-label function once per distinct label and gather the results back to the rows"""
+    codes, uniques = pd.factorize(values)
+    resolved = np.empty(len(uniques) + 1, dtype=object)
+    resolved[:-1] = [resolver(label) for label in uniques]
+    resolved[-1] = missing  # code -1 marks a missing label
+    return pd.Series(resolved[codes], index=values.index, dtype=object)
+
+
+def country_iris(values: pd.Series) -> pd.Series:
+    """IRI strings of a label column"""
+    return resolve_column(values, country_iri)
+
+
+def country_urirefs(values: pd.Series) -> pd.Series:
+    """Interned URIRefs of a label column"""
+    return resolve_column(values, country_uriref)
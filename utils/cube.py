@@ -0,0 +1,181 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.eurostat_cache import data_version, load_all_partners
+from utils.labels import AGGREGATE_PATTERN
+from utils.periods import month_key, month_key_label
+
+logger = logging.getLogger(__name__)
+
+CUBE_DIR = 'data/cache/cube'
+INDEX_PATH = os.path.join(CUBE_DIR, 'index.json')
+
+
+class TradeCube:
+    """Dense reporter x partner x month x flow array of VALUE_IN_EUR.
+
+    Cells without a Eurostat row are NaN, so a missing month is never mistaken
+    for a zero trade value. The array is memory-mapped read-only: every process
+    that opens the cube shares the same pages through the OS page cache.
+    """
+
+    def __init__(self, values: np.ndarray, index: Dict):
+        self.values = values
+        self.version = index['version']
+        self.reporters: List[str] = index['reporters']
+        self.partners: List[str] = index['partners']
+        self.flows: List[str] = index['flows']
+        self.month_keys = np.arange(index['first_month'], index['first_month'] + values.shape[2])
+        self._reporters = {label: i for i, label in enumerate(self.reporters)}
+        self._partners = {label: i for i, label in enumerate(self.partners)}
+        self._flows = {label: i for i, label in enumerate(self.flows)}
+
+    @property
+    def periods(self) -> pd.DatetimeIndex:
+        """First day of every month on the month axis"""
+        return pd.to_datetime([month_key_label(key) for key in self.month_keys], format='%Y-%m')
+
+    def has_partner(self, partner: str) -> bool:
+        return partner in self._partners
+
+    def reporter_mask(self, pattern: str) -> np.ndarray:
+        """Mask of reporters whose label matches a regex"""
+        regex = re.compile(pattern)
+        return np.array([bool(regex.search(label)) for label in self.reporters])
+
+    def member_states(self) -> np.ndarray:
+        """Mask of individual reporting countries, excluding EU and euro area aggregates"""
+        return ~self.reporter_mask(AGGREGATE_PATTERN)
+
+    def partner_slice(self, partner: str, flow: str = 'EXPORT') -> np.ndarray:
+        """Reporter x month view of one partner and flow"""
+        return self.values[:, self._partners[partner], :, self._flows[flow]]
+
+    def monthly_by_reporter(self, partner: str, flow: str = 'EXPORT',
+                            reporters: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Long PERIOD / REPORTER / VALUE_IN_EUR frame of the months a reporter has data for"""
+        reporters = self.member_states() if reporters is None else reporters
+        block = self.partner_slice(partner, flow)[reporters]
+        labels = np.array(self.reporters, dtype=object)[reporters]
+
+        # Month-major order, like a groupby(['PERIOD', 'REPORTER'])
+        months, rows = np.nonzero(~np.isnan(block.T))
+        return pd.DataFrame({
+            'PERIOD': self.periods[months],
+            'REPORTER': labels[rows],
+            'VALUE_IN_EUR': block[rows, months],
+        })
+
+    def monthly_total(self, partner: str, flow: str = 'EXPORT',
+                      reporters: Optional[np.ndarray] = None) -> pd.Series:
+        """Sum over reporters for every month with data, indexed by 'YYYY-MM'"""
+        reporters = self.member_states() if reporters is None else reporters
+        block = self.partner_slice(partner, flow)[reporters]
+        present = ~np.isnan(block).all(axis=0)
+        totals = np.nansum(block, axis=0)
+        labels = [month_key_label(key) for key in self.month_keys[present]]
+        return pd.Series(totals[present], index=pd.Index(labels, name='PERIOD'), name='VALUE_IN_EUR')
+
+    def yearly_total(self, partner: str, flow: str = 'EXPORT',
+                     reporters: Optional[np.ndarray] = None) -> pd.Series:
+        """Sum over reporters and months for every year with data"""
+        reporters = self.member_states() if reporters is None else reporters
+        block = self.partner_slice(partner, flow)[reporters]
+        years = self.month_keys // 12
+        present = ~np.isnan(block).all(axis=0)
+        monthly = np.nansum(block, axis=0)
+        totals = pd.Series(monthly[present]).groupby(years[present]).sum()
+        totals.index.name = 'Year'
+        totals.name = 'VALUE_IN_EUR'
+        return totals
+
+
+def build_cube(version: Optional[str] = None) -> Dict:
+    """Materialize the monthly cube from the Parquet cache into a .npy file and JSON index"""
+    start = time.perf_counter()
+    version = version or data_version()
+    data = load_all_partners()
+    data = data[data['MONTH'] > 0]
+
+    reporters = sorted(data['REPORTER'].astype(str).unique())
+    partners = sorted(data['PARTNER'].astype(str).unique())
+    flows = sorted(data['FLOW'].astype(str).unique())
+    keys = month_key(data['YEAR'].to_numpy(np.int32), data['MONTH'].to_numpy(np.int32))
+    first_month = int(keys.min())
+
+    cells = (
+        pd.Categorical(data['REPORTER'].astype(str), categories=reporters).codes,
+        pd.Categorical(data['PARTNER'].astype(str), categories=partners).codes,
+        keys - first_month,
+        pd.Categorical(data['FLOW'].astype(str), categories=flows).codes,
+    )
+    values = np.full((len(reporters), len(partners), int(keys.max()) - first_month + 1, len(flows)), np.nan)
+    values[cells] = 0.0
+    np.add.at(values, cells, data['VALUE_IN_EUR'].to_numpy())
+
+    index = {
+        'version': version,
+        'reporters': reporters,
+        'partners': partners,
+        'flows': flows,
+        'first_month': first_month,
+        'shape': list(values.shape),
+        'values': f"values-{version[:16]}.npy",
+    }
+
+    # The values file is named after the data version and the index is swapped in
+    # last, so readers never pair an index with another version's array
+    os.makedirs(CUBE_DIR, exist_ok=True)
+    values_path = os.path.join(CUBE_DIR, index['values'])
+    tmp_values = f"{values_path}.{os.getpid()}.tmp.npy"
+    tmp_index = f"{INDEX_PATH}.{os.getpid()}.tmp"
+    np.save(tmp_values, values)
+    os.replace(tmp_values, values_path)
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_index, INDEX_PATH)
+
+    # Processes that mapped an older cube keep their pages after the unlink
+    for name in os.listdir(CUBE_DIR):
+        if name.startswith('values-') and name != index['values'] and '.tmp' not in name:
+            os.remove(os.path.join(CUBE_DIR, name))
+
+    logger.info("Built cube %s (%.1f MB) in %.2fs", values.shape, values.nbytes / 1e6,
+                time.perf_counter() - start)
+    return index
+
+
+def load_cube() -> TradeCube:
+    """Open the memory-mapped cube, rebuilding it if the cached data changed"""
+    version = data_version()
+    try:
+        with open(INDEX_PATH, encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        index = None
+
+    if index is None or index['version'] != version \
+            or not os.path.exists(os.path.join(CUBE_DIR, index['values'])):
+        index = build_cube(version)
+    return TradeCube(np.load(os.path.join(CUBE_DIR, index['values']), mmap_mode='r'), index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the reporter x partner x month x flow cube")
+    parser.parse_args()
+    start = time.perf_counter()
+    index = build_cube()
+    print(f"Cube {tuple(index['shape'])} written to {CUBE_DIR}/{index['values']} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds there rely on the atomic rename alone
+    fcntl = None
+
+from utils.eurostat_cache import data_version
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = 'data/cache/shared'
+
+# A page reads several slices per run; the sources are re-versioned at most this often
+VERSION_CHECK_SECONDS = 5.0
+
+
+class Dataset(NamedTuple):
+    """A named group of tables and the functions that version and build them"""
+    version: Callable[[], str]
+    build: Callable[[], Dict[str, pd.DataFrame]]
+
+
+def _yearly_pivot_version() -> str:
+    from utils.anomalies import YEARLY_FOLDER
+    from utils.countries import REGISTRY_PATH
+    stat = os.stat(REGISTRY_PATH)
+    return f"{data_version([YEARLY_FOLDER])}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _yearly_pivot_tables() -> Dict[str, pd.DataFrame]:
+    from utils.anomalies import load_yearly_exports, yearly_pivot
+    pivot = yearly_pivot(load_yearly_exports())
+    pivot.columns = pivot.columns.astype(str)  # Arrow column names are strings
+    return {'pivot': pivot.reset_index()}
+
+
+def _observations_version() -> str:
+    from rdf_creator import folders
+    return data_version(list(folders.values()))
+
+
+def _observations_tables() -> Dict[str, pd.DataFrame]:
+    from rdf_creator import folders, load_folder
+    frames = [df for df in (load_folder(country, folder_path) for country, folder_path in folders.items())
+              if not df.empty]
+    return {'observations': pd.concat(frames, ignore_index=True)}
+
+
+def _trade_payload_version() -> str:
+    from utils.trade_payload import payload_version
+    return payload_version()
+
+
+def _trade_payload_tables() -> Dict[str, pd.DataFrame]:
+    from utils.trade_payload import build_payload
+    return build_payload()
+
+
+# Everything the pages read through the service
+DATASETS: Dict[str, Dataset] = {
+    'yearly_pivot': Dataset(_yearly_pivot_version, _yearly_pivot_tables),
+    'observations': Dataset(_observations_version, _observations_tables),
+    'trade_payload': Dataset(_trade_payload_version, _trade_payload_tables),
+}
+
+_opened: Dict[str, Dict] = {}
+_lock = threading.Lock()
+
+
+def _dataset_dir(name: str, version: str) -> str:
+    digest = hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(SERVICE_DIR, f"{name}-{digest}")
+
+
+def write_tables(name: str, version: str, tables: Dict[str, pd.DataFrame]) -> str:
+    """Write the tables of a dataset as uncompressed Arrow IPC files, swapped in with one rename"""
+    path = _dataset_dir(name, version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for table_name, df in tables.items():
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(os.path.join(tmp_path, f"{table_name}.arrow"), 'wb') as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    with open(os.path.join(tmp_path, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'name': name, 'version': version, 'tables': list(tables)}, f, indent=1)
+    os.rename(tmp_path, path)
+
+    # Processes that mapped an older version keep their pages after the unlink
+    prefix = f"{name}-"
+    for entry in os.listdir(SERVICE_DIR):
+        if entry.startswith(prefix) and entry != os.path.basename(path) and '.tmp' not in entry:
+            shutil.rmtree(os.path.join(SERVICE_DIR, entry), ignore_errors=True)
+    return path
+
+
+def _build_locked(name: str, version: str) -> str:
+    """Build a dataset unless another process has; one builder per host at a time"""
+    path = _dataset_dir(name, version)
+    os.makedirs(SERVICE_DIR, exist_ok=True)
+    with open(os.path.join(SERVICE_DIR, f".{name}.lock"), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            write_tables(name, version, DATASETS[name].build())
+            logger.info("Built shared dataset %s in %.2fs", name, time.perf_counter() - start)
+    return path
+
+
+def _map_tables(path: str) -> Dict[str, pa.Table]:
+    """Tables of a dataset directory, memory-mapped: their buffers are the OS page cache's"""
+    with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    tables = {}
+    for table_name in index['tables']:
+        source = pa.memory_map(os.path.join(path, f"{table_name}.arrow"), 'r')
+        tables[table_name] = ipc.open_file(source).read_all()
+    return tables
+
+
+def open_dataset(name: str) -> Dict[str, pa.Table]:
+    """Memory-mapped tables of the current version of a dataset, built on first use on this host"""
+    opened = _opened.get(name)
+    if opened is not None and time.monotonic() - opened['checked'] < VERSION_CHECK_SECONDS:
+        return opened['tables']
+    version = DATASETS[name].version()
+    with _lock:
+        opened = _opened.get(name)
+        if opened is None or opened['version'] != version:
+            path = _dataset_dir(name, version)
+            if not os.path.exists(path):
+                path = _build_locked(name, version)
+            opened = _opened[name] = {'version': version, 'tables': _map_tables(path)}
+        opened['checked'] = time.monotonic()
+    return opened['tables']
+
+
+def dataset_version(name: str) -> str:
+    """Version of the tables open_dataset currently returns; a cache key for anything derived from them"""
+    open_dataset(name)
+    return _opened[name]['version']
+
+
+def table(name: str, table_name: Optional[str] = None) -> pa.Table:
+    """One table of a dataset; the first one when no table is named"""
+    tables = open_dataset(name)
+    return tables[table_name] if table_name is not None else next(iter(tables.values()))
+
+
+def frame(name: str, table_name: Optional[str] = None, **equals) -> pd.DataFrame:
+    """Rows of a shared table where every keyword column equals its value, as a new frame"""
+    result = table(name, table_name)
+    for column, value in equals.items():
+        result = result.filter(pc.equal(result[column], value))
+    return result.to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the datasets the pages share through memory-mapped files")
+    parser.add_argument('names', nargs='*', help=f"Datasets to build: {', '.join(DATASETS)} (default: all)")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+
+    for name in args.names or DATASETS:
+        start = time.perf_counter()
+        tables = open_dataset(name)
+        size = sum(t.nbytes for t in tables.values())
+        print(f"{name}: {', '.join(f'{n} ({t.num_rows} rows)' for n, t in tables.items())}, "
+              f"{size / 1e6:.1f} MB mapped in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent refreshes there rely on the atomic renames alone
+    fcntl = None
+
+from utils.ingest import EUROSTAT_COLUMNS, EUROSTAT_DTYPES, list_relational_views
+from utils.labels import LABEL_COLUMNS, encode_labels, memory_usage
+from utils.periods import eurostat_labels, parse_periods
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'data/cache/eurostat'
+DATASET_DIR = os.path.join(CACHE_DIR, 'dataset')
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'folders')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+LOCK_PATH = os.path.join(CACHE_DIR, '.lock')
+
+# Bump whenever the normalization below changes, so stale caches are dropped
+CACHE_VERSION = 2
+
+SOURCE_FOLDER_PATTERNS = ['data/*_eurostat', 'data/eu_year_export']
+
+NORMALIZED_COLUMNS = EUROSTAT_COLUMNS + ['YEAR', 'MONTH', 'SOURCE']
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('PARTNER_KEY', pa.string()), ('YEAR', pa.int16())]),
+    flavor='hive'
+)
+
+# Eurostat sometimes prefixes labels with their code ('2-EXPORT', 'T-Total')
+CODE_PREFIXES = {
+    'FLOW': r'^\d+-',
+    'PRODUCT': r'^TOTAL-',
+    'STAT_PROCEDURE': r'^T-',
+}
+
+# The 2016 extracts were downloaded with the French interface
+FLOW_LABELS = {
+    'EXPORTATION': 'EXPORT',
+    'IMPORTATION': 'IMPORT',
+}
+
+def source_folders() -> List[str]:
+    """List every Eurostat folder covered by the cache"""
+    folders = []
+    for pattern in SOURCE_FOLDER_PATTERNS:
+        folders.extend(sorted(glob.glob(pattern)))
+    return folders
+
+
+def label_key(label: str) -> str:
+    """Short, filesystem-safe key for a label (partner names can exceed path limits)"""
+    ascii_label = unicodedata.normalize('NFKD', label).encode('ascii', 'ignore').decode()
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', ascii_label).strip('_')[:40]
+    digest = hashlib.sha1(label.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+def normalize_relational_view(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    """Strip code prefixes, unify labels and split PERIOD into YEAR and MONTH"""
+    df = df.copy()
+    for column, pattern in CODE_PREFIXES.items():
+        df[column] = df[column].str.replace(pattern, '', regex=True)
+    df['FLOW'] = df['FLOW'].replace(FLOW_LABELS)
+
+    # '201904-Apr. 2019' -> 'Apr. 2019', '201952-Jan.-Dec. 2019' -> 'Jan.-Dec. 2019'
+    periods = parse_periods(df['PERIOD'])
+    df['PERIOD'] = eurostat_labels(df['PERIOD'])
+    df['YEAR'] = periods['YEAR']
+    df['MONTH'] = periods['MONTH']
+
+    df['SOURCE'] = source
+    partner_keys = {partner: label_key(partner) for partner in df['PARTNER'].unique()}
+    df['PARTNER_KEY'] = df['PARTNER'].map(partner_keys)
+    return df
+
+
+def file_fingerprint(path: str) -> Dict:
+    """Size, modification time and content hash of a source file"""
+    stat = os.stat(path)
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+
+
+@contextmanager
+def cache_lock():
+    """Hold the cache for writing; one process per host at a time, released on exit"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(LOCK_PATH, 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+def _read_manifest() -> Optional[Dict]:
+    """The cache manifest on disk, None if it is missing or was built by another version"""
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get('version') == CACHE_VERSION else None
+
+
+def load_manifest() -> Dict:
+    """Load the cache manifest, an empty one if the cache has to be rebuilt"""
+    return _read_manifest() or {'version': CACHE_VERSION, 'files': {}, 'snapshots': {}}
+
+
+def save_manifest(manifest: Dict):
+    """Atomically write the cache manifest"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _remove_fragments(entry: Dict):
+    for fragment in entry.get('fragments', []):
+        try:
+            os.remove(os.path.join(DATASET_DIR, fragment))
+        except FileNotFoundError:
+            pass
+
+
+def _write_fragments(path: str, source: str, fingerprint: Dict) -> Dict:
+    """Normalize one source CSV and write it into the partitioned dataset"""
+    df = pd.read_csv(path, usecols=EUROSTAT_COLUMNS, dtype=EUROSTAT_DTYPES)
+    df = normalize_relational_view(df, source)
+
+    fragments = []
+    # Fragment names derive from the source path so a rewrite replaces them in place
+    file_id = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        DATASET_DIR,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"{file_id}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        file_visitor=lambda written: fragments.append(os.path.relpath(written.path, DATASET_DIR)),
+    )
+    return dict(fingerprint, source=source, rows=len(df), fragments=sorted(fragments))
+
+
+def _snapshot_path(folder: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{label_key(folder)}.parquet")
+
+
+def _folder_digest(entries: Dict, folder: str) -> str:
+    """Digest of the content hashes of every source file in a folder"""
+    sha1 = hashlib.sha1()
+    for path, entry in sorted(entries.items()):
+        if entry['source'] == folder:
+            sha1.update(f"{path}:{entry['sha256']}\n".encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def _read_fragments(entries: Dict, folder: str) -> pa.Table:
+    fragments = [
+        os.path.join(DATASET_DIR, fragment)
+        for path, entry in sorted(entries.items())
+        if entry['source'] == folder
+        for fragment in entry['fragments']
+    ]
+    dataset = ds.dataset(fragments, format='parquet', partitioning=PARTITIONING,
+                         partition_base_dir=DATASET_DIR)
+    return dataset.to_table(columns=NORMALIZED_COLUMNS)
+
+
+def _write_snapshot(entries: Dict, folder: str):
+    """Compact a folder's partitioned fragments into a single file for fast startup reads"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = f"{_snapshot_path(folder)}.{os.getpid()}.tmp"
+    pq.write_table(_read_fragments(entries, folder), tmp_path)
+    os.replace(tmp_path, _snapshot_path(folder))
+
+
+def _refresh(manifest: Dict, folders: Iterable[str]) -> Dict[str, int]:
+    """Update the fragments, the snapshots and the manifest; the caller holds cache_lock"""
+    entries = manifest['files']
+    snapshots = manifest['snapshots']
+    counts = {'unchanged': 0, 'written': 0, 'removed': 0}
+    changed = False
+
+    for folder in folders:
+        folder = os.path.normpath(folder)
+        sources = list_relational_views(folder)
+
+        for path in sources:
+            stat = os.stat(path)
+            entry = entries.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                counts['unchanged'] += 1
+                continue
+
+            fingerprint = file_fingerprint(path)
+            changed = True
+            if entry and entry['sha256'] == fingerprint['sha256']:
+                # Touched but not modified: keep the fragments, remember the new mtime
+                entry.update(fingerprint)
+                counts['unchanged'] += 1
+                continue
+
+            if entry:
+                _remove_fragments(entry)
+            entries[path] = _write_fragments(path, folder, fingerprint)
+            counts['written'] += 1
+
+        current = set(sources)
+        for path in [p for p, e in entries.items() if e['source'] == folder and p not in current]:
+            _remove_fragments(entries.pop(path))
+            counts['removed'] += 1
+
+        digest = _folder_digest(entries, folder)
+        if sources and (snapshots.get(folder) != digest or not os.path.exists(_snapshot_path(folder))):
+            _write_snapshot(entries, folder)
+            snapshots[folder] = digest
+            changed = True
+        elif not sources and snapshots.pop(folder, None):
+            os.remove(_snapshot_path(folder))
+            changed = True
+
+    if changed:
+        save_manifest(manifest)
+    return counts
+
+
+def refresh_cache(folders: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Bring the cache up to date, rewriting only source files whose fingerprint changed"""
+    folders = source_folders() if folders is None else folders
+    with cache_lock():
+        # Read under the lock: another process may have refreshed the cache meanwhile
+        manifest = _read_manifest()
+        if manifest is None:
+            shutil.rmtree(DATASET_DIR, ignore_errors=True)
+            shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+            manifest = load_manifest()
+        return _refresh(manifest, folders)
+
+
+def _empty_frame() -> pd.DataFrame:
+    dtypes = dict(EUROSTAT_DTYPES, YEAR='int16', MONTH='int8', SOURCE=str)
+    return encode_labels(pd.DataFrame({col: pd.Series(dtype=dtypes[col]) for col in NORMALIZED_COLUMNS}))
+
+
+def data_version(folders: Optional[Iterable[str]] = None) -> str:
+    """Digest identifying the current content of the cached folders"""
+    folders = source_folders() if folders is None else list(folders)
+    refresh_cache(folders)
+    snapshots = load_manifest()['snapshots']
+    sha1 = hashlib.sha1(f"v{CACHE_VERSION}".encode('utf-8'))
+    for folder in sorted(os.path.normpath(f) for f in folders):
+        sha1.update(f"{folder}:{snapshots.get(folder, '')}\n".encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def read_cached_folder(folder_path: str) -> pd.DataFrame:
+    """Read the normalized rows of one source folder from its compacted snapshot"""
+    path = _snapshot_path(os.path.normpath(folder_path))
+    if not os.path.exists(path):
+        return _empty_frame()
+    # Label columns come back dictionary-encoded, without materializing a string per row
+    table = pq.read_table(path, read_dictionary=LABEL_COLUMNS)
+    return encode_labels(table.to_pandas())
+
+
+def read_partitions(partners: Optional[List[str]] = None, years: Optional[List[int]] = None) -> pd.DataFrame:
+    """Read rows of every cached folder, pruning the partitioned dataset by partner and year"""
+    dataset = ds.dataset(DATASET_DIR, format='parquet', partitioning=PARTITIONING)
+    conditions = []
+    if partners is not None:
+        conditions.append(ds.field('PARTNER_KEY').isin([label_key(p) for p in partners]))
+    if years is not None:
+        conditions.append(ds.field('YEAR').isin(list(years)))
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    table = dataset.to_table(columns=NORMALIZED_COLUMNS, filter=condition)
+    return encode_labels(table.to_pandas())
+
+
+def load_all_partners(years: Optional[List[int]] = None) -> pd.DataFrame:
+    """Every cached partner of every folder, deduplicated across overlapping extracts"""
+    start = time.perf_counter()
+    folders = source_folders()
+    refresh_cache(folders)
+    frames = [read_cached_folder(folder) for folder in folders]
+    # Re-encode once the dictionary holds every label so all frames share one dtype
+    data = pd.concat([encode_labels(frame) for frame in frames], ignore_index=True)
+    if years is not None:
+        data = data[data['YEAR'].isin(years)]
+    # kazahstan_ and kazakhstan_export_eurostat hold the same rows in two PERIOD formats
+    data = data.drop_duplicates(subset=['REPORTER', 'PARTNER', 'FLOW', 'PRODUCT', 'YEAR', 'MONTH'])
+    logger.info("Loaded all partners: %s rows, %.1f MB in %.3fs",
+                f"{len(data):,}", memory_usage(data) / 1e6, time.perf_counter() - start)
+    return data
+
+
+def load_eurostat(folder_path: str) -> pd.DataFrame:
+    """Normalized Eurostat rows of a folder, served from the Parquet cache"""
+    start = time.perf_counter()
+    counts = refresh_cache([folder_path])
+    data = read_cached_folder(folder_path)
+    logger.info("Loaded %s from cache: %s rows, %.1f KB in %.3fs (%s)",
+                folder_path, f"{len(data):,}", memory_usage(data) / 1e3,
+                time.perf_counter() - start, counts)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the normalized Parquet cache of Eurostat extracts")
+    parser.add_argument('--rebuild', action='store_true', help="drop the cache and rebuild it from scratch")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        with cache_lock():
+            shutil.rmtree(DATASET_DIR, ignore_errors=True)
+            shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+            if os.path.exists(MANIFEST_PATH):
+                os.remove(MANIFEST_PATH)
+
+    start = time.perf_counter()
+    counts = refresh_cache()
+    print(f"Cache refreshed in {time.perf_counter() - start:.2f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
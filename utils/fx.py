@@ -0,0 +1,103 @@
+import argparse
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.periods import month_key, month_key_label, parse_periods
+
+FX_PATH = 'data/fx_usd_eur.csv'
+
+
+class FxRates:
+    """Average USD per EUR rates as NumPy arrays, one indexed by month key and one by year.
+
+    Months and years without a rate hold NaN; looking them up raises instead
+    of converting at a made-up rate.
+    """
+
+    def __init__(self, rates: pd.DataFrame):
+        periods = parse_periods(rates['PERIOD'].astype(str))
+        values = rates['USD_PER_EUR'].to_numpy(dtype=float)
+        monthly = (periods['MONTH'] > 0).to_numpy()
+
+        keys = periods['MONTH_KEY'].to_numpy()[monthly]
+        self.first_key = int(keys.min())
+        self.monthly = np.full(int(keys.max()) - self.first_key + 1, np.nan)
+        self.monthly[keys - self.first_key] = values[monthly]
+
+        years = periods['YEAR'].to_numpy(dtype=np.int64)[~monthly]
+        self.first_year = int(years.min())
+        self.annual = np.full(int(years.max()) - self.first_year + 1, np.nan)
+        self.annual[years - self.first_year] = values[~monthly]
+
+    @classmethod
+    def load(cls, path: str = FX_PATH) -> 'FxRates':
+        return cls(pd.read_csv(path, comment='#', dtype={'PERIOD': str}))
+
+    @staticmethod
+    def _gather(table: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        inside = (positions >= 0) & (positions < len(table))
+        rates = np.full(len(positions), np.nan)
+        rates[inside] = table[positions[inside]]
+        return rates
+
+    def monthly_rates(self, keys: np.ndarray) -> np.ndarray:
+        """Rate of every month key, in a single gather"""
+        keys = np.asarray(keys, dtype=np.int64)
+        rates = self._gather(self.monthly, keys - self.first_key)
+        missing = np.isnan(rates)
+        if missing.any():
+            labels = sorted({month_key_label(key) for key in np.unique(keys[missing])})
+            raise KeyError(f"No USD/EUR rate for {', '.join(labels)} in {FX_PATH}")
+        return rates
+
+    def annual_rates(self, years: np.ndarray) -> np.ndarray:
+        """Yearly average rate of every year, in a single gather"""
+        years = np.asarray(years, dtype=np.int64)
+        rates = self._gather(self.annual, years - self.first_year)
+        missing = np.isnan(rates)
+        if missing.any():
+            labels = [str(year) for year in np.unique(years[missing])]
+            raise KeyError(f"No USD/EUR rate for {', '.join(labels)} in {FX_PATH}")
+        return rates
+
+    def rates(self, years: np.ndarray, months: Optional[np.ndarray] = None) -> np.ndarray:
+        """Monthly rate where a month is given (1-12), the yearly average where it is 0 or absent"""
+        years = np.asarray(years, dtype=np.int64)
+        if months is None:
+            return self.annual_rates(years)
+        months = np.asarray(months, dtype=np.int64)
+        rates = np.empty(len(years))
+        monthly = months > 0
+        rates[monthly] = self.monthly_rates(month_key(years[monthly], months[monthly]))
+        rates[~monthly] = self.annual_rates(years[~monthly])
+        return rates
+
+
+@lru_cache(maxsize=None)
+def fx_rates() -> FxRates:
+    """The bundled rates, loaded once per process"""
+    return FxRates.load()
+
+
+def usd_to_eur(values, years, months=None) -> np.ndarray:
+    """Convert USD amounts to EUR at the average rate of their month, or of their year for annual rows"""
+    rates = fx_rates().rates(np.asarray(years), None if months is None else np.asarray(months))
+    return np.asarray(values, dtype=float) / rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the bundled USD/EUR rates")
+    parser.add_argument('--year', type=int, help="Only show this year")
+    args = parser.parse_args()
+
+    rates = pd.read_csv(FX_PATH, comment='#', dtype={'PERIOD': str})
+    if args.year:
+        rates = rates[rates['PERIOD'].str.startswith(str(args.year))]
+    print(rates.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import glob
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columns of the Eurostat "Relational View" CSV export
+EUROSTAT_COLUMNS = ['REPORTER', 'PARTNER', 'PRODUCT', 'FLOW', 'STAT_PROCEDURE', 'PERIOD', 'VALUE_IN_EUR']
+
+EUROSTAT_DTYPES = {
+    'REPORTER': str,
+    'PARTNER': str,
+    'PRODUCT': str,
+    'FLOW': str,
+    'STAT_PROCEDURE': str,
+    'PERIOD': str,
+    'VALUE_IN_EUR': 'float64',
+}
+
+
+@dataclass
+class IngestStats:
+    """Throughput figures for one folder ingest"""
+    folder: str
+    files: int
+    rows: int
+    bytes_read: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes_read / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.folder}: {self.files} files, {self.rows:,} rows, "
+                f"{self.bytes_read / 1e6:.2f} MB in {self.seconds:.3f}s "
+                f"({self.rows_per_sec:,.0f} rows/s, {self.mb_per_sec:.1f} MB/s)")
+
+
+def list_relational_views(folder_path: str) -> List[str]:
+    """List the Relational View CSV files of a folder in a stable order"""
+    return sorted(glob.glob(os.path.join(folder_path, '*.csv')))
+
+
+def read_relational_views(folder_path: str) -> Tuple[pd.DataFrame, IngestStats]:
+    """Read all Relational View CSVs of a folder into one frame with a single concat"""
+    start = time.perf_counter()
+    files = list_relational_views(folder_path)
+
+    frames = [
+        pd.read_csv(file, usecols=EUROSTAT_COLUMNS, dtype=EUROSTAT_DTYPES)
+        for file in files
+    ]
+    if frames:
+        data = pd.concat(frames, ignore_index=True)
+    else:
+        data = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in EUROSTAT_DTYPES.items()})
+
+    stats = IngestStats(
+        folder=folder_path,
+        files=len(files),
+        rows=len(data),
+        bytes_read=sum(os.path.getsize(file) for file in files),
+        seconds=time.perf_counter() - start,
+    )
+    return data, stats
+
+
+def load_relational_views(folder_path: str) -> pd.DataFrame:
+    """Read a folder of Relational View CSVs and log the ingest throughput"""
+    data, stats = read_relational_views(folder_path)
+    logger.info("Ingested %s", stats)
+    return data
+
+
+def main():
+    folders = sorted(glob.glob('data/*_eurostat')) + ['data/eu_year_export']
+    total = IngestStats('total', 0, 0, 0, 0.0)
+    for folder in folders:
+        _, stats = read_relational_views(folder)
+        print(stats)
+        total.files += stats.files
+        total.rows += stats.rows
+        total.bytes_read += stats.bytes_read
+        total.seconds += stats.seconds
+    print(total)
+
+
+if __name__ == "__main__":
+    main()
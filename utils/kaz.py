@@ -1,129 +1,17 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import logging
 import glob
 import re
 
+from utils.converter_core import convert_national_table, print_unmapped
+from utils.workbook_cache import find_row, read_sheet, sheet_names
+
 class KazakhstanDataConverter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        
-        self.exchange_rates = {
-            2019: 1.12,
-            2020: 1.14,
-            2021: 1.18,
-            2022: 1.05,
-            2023: 1.07
-        }
-
-        # Mapping for country names to match Eurostat format
-        self.country_mapping = {
-            # Special groupings and regions
-            "Всего": "World",
-            "Страны СНГ": "Commonwealth of Independent States",
-            "Страны ЕАЭС": "Eurasian Economic Union",
-            "Страны ЕС": "European Union - 27 countries (from 2020)",
-            "Остальные страны мира": "Rest of the world",
-            "Страны вне ЕАЭС": "Non-EAEU countries",
-            "Страны вне ЕС": "Non-EU countries",
-            
-            # EU Countries
-            "Австрия": "Austria",
-            "Бельгия": "Belgium",
-            "Болгария": "Bulgaria",
-            "Кипр": "Cyprus",
-            "Чешская Республика": "Czechia",
-            "Германия": "Germany",
-            "Дания": "Denmark",
-            "Эстония": "Estonia",
-            "Испания": "Spain",
-            "Финляндия": "Finland",
-            "Франция": "France",
-            "Греция": "Greece",
-            "Хорватия": "Croatia",
-            "Венгрия": "Hungary",
-            "Ирландия": "Ireland",
-            "Италия": "Italy",
-            "Литва": "Lithuania",
-            "Люксембург": "Luxembourg",
-            "Республика Латвия": "Latvia",
-            "Мальта": "Malta",
-            "Нидерланды": "Netherlands",
-            "Польша": "Poland",
-            "Португалия": "Portugal",
-            "Румыния": "Romania",
-            "Швеция": "Sweden",
-            "Словения": "Slovenia",
-            "Словакия": "Slovakia",
-            
-            # CIS and EAEU Countries
-            "Армения": "Armenia",
-            "Беларусь": "Belarus",
-            "Кыргызстан": "Kyrgyzstan",
-            "Россия": "Russia",
-            "Азербайджан": "Azerbaijan",
-            "Молдова, Республика": "Moldova",
-            "Таджикистан": "Tajikistan",
-            "Туркменистан": "Turkmenistan",
-            "Украина": "Ukraine",
-            "Узбекистан": "Uzbekistan",
-            
-            # Other European Countries
-            "Соединенное Королевство": "United Kingdom",
-            "Швейцария": "Switzerland",
-            "Норвегия": "Norway",
-            "Исландия": "Iceland",
-            "Сербия": "Serbia",
-            "Черногория (Монтенегро)": "Montenegro",
-            "Македония": "North Macedonia",
-            "Албания": "Albania",
-            "Босния и Герцеговина": "Bosnia and Herzegovina",
-            "Лихтенштейн": "Liechtenstein",
-            
-            # Asian Countries
-            "Китай": "China",
-            "Япония": "Japan",
-            "Республика Корея": "South Korea",
-            "Турция": "Turkey",
-            "Индия": "India",
-            "Вьетнам": "Vietnam",
-            "Индонезия": "Indonesia",
-            "Малайзия": "Malaysia",
-            "Сингапур": "Singapore",
-            "Таиланд": "Thailand",
-            "Объединенные Арабские Эмираты": "United Arab Emirates",
-            "Саудовская Аравия": "Saudi Arabia",
-            "Израиль": "Israel",
-            "Иран, Исламская Республика": "Iran",
-            "Пакистан": "Pakistan",
-            "Бангладеш": "Bangladesh",
-            "Монголия": "Mongolia",
-            "Тайвань (Китай)": "Taiwan",
-            "Гонконг": "Hong Kong",
-            
-            # Americas
-            "Соединенные Штаты Америки": "United States",
-            "Канада": "Canada",
-            "Мексика": "Mexico",
-            "Бразилия": "Brazil",
-            "Аргентина": "Argentina",
-            "Чили": "Chile",
-            "Колумбия": "Colombia",
-            "Перу": "Peru",
-            
-            # Oceania
-            "Австралия": "Australia",
-            "Новая Зеландия": "New Zealand",
-            
-            # Africa
-            "Египет": "Egypt",
-            "Южная Африка": "South Africa",
-            "Марокко": "Morocco",
-            "Алжир": "Algeria",
-            "Нигерия": "Nigeria"
-        }
 
     def extract_year_from_filename(self, filename: str) -> int:
         """Extract year from filename"""
@@ -140,8 +28,7 @@ class KazakhstanDataConverter:
             # For 2023 file, we need to select the correct sheet
             if year == 2023:
                 # Get list of sheets
-                excel_file = pd.ExcelFile(file_path)
-                sheets = excel_file.sheet_names
+                sheets = sheet_names(file_path)
                 print(f"Available sheets: {sheets}")
                 
                 # Try to find sheet with '2023' in the name
@@ -160,13 +47,13 @@ class KazakhstanDataConverter:
                 
                 if target_sheet:
                     print(f"Using sheet: {target_sheet}")
-                    df = pd.read_excel(file_path, sheet_name=target_sheet, header=None)
+                    df = read_sheet(file_path, target_sheet)
                 else:
                     # If no suitable sheet found, use first sheet
-                    df = pd.read_excel(file_path, sheet_name=0, header=None)
+                    df = read_sheet(file_path, 0)
             else:
                 # For other years, read the default sheet
-                df = pd.read_excel(file_path, header=None)
+                df = read_sheet(file_path)
                 
             print(f"Initial shape: {df.shape}")
             print("df", year, df.columns)
@@ -174,11 +61,7 @@ class KazakhstanDataConverter:
             print(f"Initial shape: {df.shape}")
             
             # Find the start of data
-            start_row = None
-            for idx, row in df.iterrows():
-                if isinstance(row[0], str) and "Всего" in row[0]:
-                    start_row = idx
-                    break
+            start_row = find_row(df, "Всего")
             
             if start_row is None:
                 raise ValueError(f"Could not find data start in file {file_path}")
@@ -213,21 +96,28 @@ class KazakhstanDataConverter:
             self.logger.error(f"Error reading file {file_path}: {e}")
             raise
 
-    def process_all_files(self, directory: str) -> pd.DataFrame:
-        """Process all Excel files in directory"""
-        all_data = []
-        
+    def list_input_files(self, directory: str) -> List[Tuple[str, int]]:
+        """Excel files of the years to convert, with their year"""
         # Find all Excel files
         file_pattern = Path(directory) / "*.xls*"
         files = glob.glob(str(file_pattern))
         
+        input_files = []
         for file_path in files:
+            year = self.extract_year_from_filename(file_path)
+            print("Year", year)
+            if year and 2019 <= year <= 2023:
+                input_files.append((file_path, year))
+        return input_files
+
+    def process_all_files(self, directory: str) -> pd.DataFrame:
+        """Process all Excel files in directory"""
+        all_data = []
+        
+        for file_path, year in self.list_input_files(directory):
             try:
-                year = self.extract_year_from_filename(file_path)
-                print("Year", year)
-                if year and 2019 <= year <= 2023:
-                    df = self.read_kazakhstan_file(file_path, year)
-                    all_data.append(df)
+                df = self.read_kazakhstan_file(file_path, year)
+                all_data.append(df)
             except Exception as e:
                 self.logger.error(f"Error processing {file_path}: {e}")
                 continue
@@ -240,58 +130,18 @@ class KazakhstanDataConverter:
     def convert_to_eurostat_format(self, df: pd.DataFrame) -> pd.DataFrame:
         """Convert Kazakhstan data to Eurostat format"""
         try:
-            eurostat_data = []
-            unmapped_countries = set()
-            
             # Regions to exclude (Russian names)
             regions_to_exclude = {
                 'Азия', 'Америка', 'Африка', 'Европа', 
                 'Австралия и Океания', 'Французские Южные Территории'
             }
             
-            for _, row in df.iterrows():
-                country = str(row['country']).strip()
-                year = int(row['year'])
-                import_value = row['import_value']
-                
-                if pd.isna(import_value) or country.lower() == 'nan':
-                    continue
-                    
-                # Skip Russian region names
-                if country in regions_to_exclude:
-                    continue
-                
-                # Convert thousand USD to EUR (multiply by 1000 for full value)
-                value_eur = float(import_value * 1000) / self.exchange_rates.get(year, 1.0)
-                
-                # Map partner names
-                partner = self.country_mapping.get(country, country)
-                
-                # Only include if we have a mapping or if it's already in English
-                if country not in self.country_mapping:
-                    # Check if the country name uses Cyrillic characters
-                    if any(ord(c) >= 1040 and ord(c) <= 1103 for c in country):
-                        unmapped_countries.add(country)
-                        continue
-                
-                eurostat_data.append({
-                    'REPORTER': 'Kazakhstan',
-                    'PARTNER': partner,
-                    'PRODUCT': 'TOTAL',
-                    'FLOW': 'IMPORT',
-                    'STAT_PROCEDURE': 'NORMAL',
-                    'PERIOD': f'Y{year}',
-                    'VALUE_IN_EUR': round(value_eur, 2)
-                })
-            
-            # if unmapped_countries:
-            #     print("\nWarning: Found countries without explicit mapping:")
-            #     print(sorted(unmapped_countries))
-            
-            eurostat_df = pd.DataFrame(eurostat_data)
-            
-            if not eurostat_df.empty:
-                eurostat_df = eurostat_df.sort_values(['PERIOD', 'PARTNER'])
+            # Partners missing from the country registry are kept only if they are already in English
+            eurostat_df, unmapped_countries = convert_national_table(
+                df['country'], df['year'], df['import_value'], 'Kazakhstan',
+                exclude=regions_to_exclude, skip_cyrillic=True
+            )
+            print_unmapped(unmapped_countries, dropped=True)
             
             return eurostat_df
             
@@ -4,40 +4,18 @@ from pathlib import Path
 from typing import Dict, List
 import logging
 
+from utils.converter_core import convert_national_table, print_unmapped, wide_to_long
+from utils.workbook_cache import read_sheet
+
 class KyrgyzDataConverter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        
-        self.exchange_rates = {
-            2019: 1.12,
-            2020: 1.14,
-            2021: 1.18,
-            2022: 1.05,
-            2023: 1.07
-        }
-        self.country_mapping = {
-            # Special groupings
-            "The EU": "European Union - 27 countries (from 2020)",
-            "Total": "World",
-            "CIS": "Commonwealth of Independent States",
-            "SCO": "Shanghai Cooperation Organisation",
-            "EAEU": "Eurasian Economic Union",
-            
-            # Countries that might need standardization
-            "Russian Federation": "Russia",
-            "USA": "United States",
-            "UK": "United Kingdom",
-            "UAE": "United Arab Emirates",
-            "Great Britain": "United Kingdom",
-            "Korea": "South Korea",
-            "Czech Republic": "Czechia"
-        }
 
     def read_kyrgyz_data(self, file_path: str) -> pd.DataFrame:
         """Read and initially process Kyrgyzstan Excel file"""
         try:
-            # Read Excel file
-            df = pd.read_excel(file_path, header=None)
+            # Read Excel file (parsed once, then served from the Parquet cache)
+            df = read_sheet(file_path)
             
             print("Initial dataframe shape:", df.shape)
             
@@ -78,55 +56,14 @@ class KyrgyzDataConverter:
     def convert_to_eurostat_format(self, df: pd.DataFrame) -> pd.DataFrame:
         """Convert Kyrgyz data to Eurostat format with yearly periods"""
         try:
-            eurostat_data = []
-            
             # Process only recent years
             recent_years = [str(year) for year in range(2019, 2024)]
+            yearly = wide_to_long(df, 'Country_EN', recent_years)
             
-            # Track any unmapped countries
-            unmapped_countries = set()
-            
-            for year in recent_years:
-                year_int = int(year)
-                
-                for _, row in df.iterrows():
-                    country_en = str(row['Country_EN']).strip()
-                    yearly_value_usd = row[year]
-                    
-                    if pd.isna(yearly_value_usd):
-                        continue
-                    
-                    # Convert thousand USD to EUR
-                    yearly_value_eur = float(yearly_value_usd * 1000) / self.exchange_rates.get(year_int, 1.0)
-                    
-                    # Map partner names to match Eurostat
-                    partner = self.country_mapping.get(country_en, country_en)
-                    
-                    if country_en not in self.country_mapping:
-                        unmapped_countries.add(country_en)
-                    
-                    # Create yearly record
-                    eurostat_data.append({
-                        'REPORTER': 'Kyrgyzstan',
-                        'PARTNER': partner,
-                        'PRODUCT': 'TOTAL',
-                        'FLOW': 'IMPORT',
-                        'STAT_PROCEDURE': 'NORMAL',
-                        'PERIOD': f'Y{year}',
-                        'VALUE_IN_EUR': round(yearly_value_eur, 2)
-                    })
-            
-            if unmapped_countries:
-                print("\nWarning: Found countries without explicit mapping:")
-                print(sorted(unmapped_countries))
-                print("These will be used as-is. Please verify if they match Eurostat naming conventions.")
-            
-            # Convert to DataFrame
-            eurostat_df = pd.DataFrame(eurostat_data)
-            
-            # Sort by period and partner
-            if not eurostat_df.empty:
-                eurostat_df = eurostat_df.sort_values(['PERIOD', 'PARTNER'])
+            eurostat_df, unmapped_countries = convert_national_table(
+                yearly['country'], yearly['year'], yearly['value'], 'Kyrgyzstan'
+            )
+            print_unmapped(unmapped_countries)
             
             return eurostat_df
             
@@ -178,7 +115,7 @@ def main():
     
     # Process data
     input_file = "data/kyrgyzstan_data/4.03.00.20 Географическое распределение импорта товаров..xlsx"
-    output_file = "national_data_converted/kyrgyz_import_yearly.csv"
+    output_file = "data/national_data_converted/kyrgyz_import_yearly.csv"
     
     print("Reading Kyrgyz data...")
     kyrgyz_df = converter.read_kyrgyz_data(input_file)
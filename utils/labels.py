@@ -0,0 +1,114 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Label columns stored as integer codes into the shared dictionary
+LABEL_COLUMNS = ['REPORTER', 'PARTNER', 'PRODUCT', 'FLOW', 'STAT_PROCEDURE', 'PERIOD', 'SOURCE']
+
+# Regional aggregates reported next to the member states (English and French exports)
+AGGREGATE_PATTERN = r'Euro area|European Union|Union européenne|Zone euro'
+EU27_PATTERN = r'European Union - 27 countries|Union européenne - 27 pays'
+
+
+class LabelDictionary:
+    """Append-only label dictionary shared by every dictionary-encoded column.
+
+    Streamlit sessions run as threads of one process, so adding labels and
+    rebuilding the derived dtype and matches happen under a lock.
+    """
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._dtype: Optional[pd.CategoricalDtype] = None
+        self._matches: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def add(self, labels: Iterable[str]):
+        """Register new labels; existing codes never change"""
+        new = [label for label in labels if label not in self.codes and isinstance(label, str)]
+        if not new:
+            return
+        with self._lock:
+            for label in new:
+                if label not in self.codes:
+                    self.codes[label] = len(self.labels)
+                    self.labels.append(label)
+                    self._dtype = None
+                    self._matches.clear()
+
+    @property
+    def dtype(self) -> pd.CategoricalDtype:
+        with self._lock:
+            if self._dtype is None:
+                self._dtype = pd.CategoricalDtype(self.labels)
+            return self._dtype
+
+    def encode(self, values: pd.Series) -> pd.Series:
+        """Dictionary-encode a column against the shared labels"""
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        # Only the distinct labels are looked up, never the rows
+        self.add(values.cat.categories)
+        return values.cat.set_categories(self.dtype.categories)
+
+    def shared_codes(self, values: pd.Series) -> np.ndarray:
+        """Shared integer codes of a column, -1 for missing values"""
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = self.encode(values)
+        categories = values.cat.categories
+        self.add(categories)
+        lookup = np.fromiter((self.codes[label] for label in categories), dtype=np.int32,
+                             count=len(categories))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, lookup[codes], -1)
+
+    def codes_matching(self, pattern: str) -> np.ndarray:
+        """Codes of every label matching a regex, scanned once per dictionary size"""
+        with self._lock:
+            if pattern not in self._matches:
+                regex = re.compile(pattern)
+                self._matches[pattern] = np.array(
+                    [code for code, label in enumerate(self.labels) if regex.search(label)],
+                    dtype=np.int32
+                )
+            return self._matches[pattern]
+
+    def matches(self, values: pd.Series, pattern: str) -> np.ndarray:
+        """Mask of rows whose label matches a regex, as an integer set-membership test"""
+        codes = self.shared_codes(values)
+        return np.isin(codes, self.codes_matching(pattern))
+
+
+# One dictionary per process so codes are comparable across loaded frames
+LABELS = LabelDictionary()
+
+
+def encode_labels(df: pd.DataFrame, columns: Iterable[str] = LABEL_COLUMNS) -> pd.DataFrame:
+    """Replace the label columns of a frame with shared categorical codes"""
+    df = df.copy()
+    for column in columns:
+        if column in df.columns:
+            df[column] = LABELS.encode(df[column])
+    return df
+
+
+def is_aggregate(values: pd.Series) -> np.ndarray:
+    """Mask of rows labelled with a regional aggregate (EU, euro area)"""
+    return LABELS.matches(values, AGGREGATE_PATTERN)
+
+
+def is_eu27(values: pd.Series) -> np.ndarray:
+    """Mask of rows labelled with the EU-27 aggregate"""
+    return LABELS.matches(values, EU27_PATTERN)
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """Deep memory footprint of a frame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
@@ -0,0 +1,159 @@
+import argparse
+import time
+import warnings
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.anomalies import MIN_GROWTH, Z_THRESHOLD
+from utils.cube import TradeCube, load_cube
+from utils.labels import EU27_PATTERN
+from utils.periods import month_key, month_key_label
+
+# Last month before the sanctions; breakouts are searched after it
+BREAK_MONTH = month_key(2022, 2)
+MIN_MONTHLY_VOLUME = 1000000
+MIN_RUN = 2
+
+
+def _prior_years_mean(values: np.ndarray, years: Optional[int]) -> np.ndarray:
+    """Mean of the same calendar month over the prior `years` years (all when None), along the last axis"""
+    *lead, n_years, _ = values.shape
+    present = ~np.isnan(values)
+    zero = np.zeros((*lead, 1, 12))
+    sums = np.concatenate([zero, np.cumsum(np.where(present, values, 0.0), axis=-2)], axis=-2)
+    counts = np.concatenate([zero, np.cumsum(present, axis=-2)], axis=-2)
+
+    # Year y sees years [start, y): cumulative sums at y minus those at start
+    end = np.arange(n_years)
+    start = np.zeros(n_years, dtype=int) if years is None else np.maximum(end - years, 0)
+    window_sums = sums[..., end, :] - sums[..., start, :]
+    window_counts = counts[..., end, :] - counts[..., start, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+def seasonal_scan(cube: TradeCube, flow: str = 'EXPORT', years: Optional[int] = None,
+                  break_month: int = BREAK_MONTH) -> dict:
+    """Seasonal-naive residuals of every reporter x partner x month cell.
+
+    The forecast of a month is the mean of the same calendar month in the
+    prior years. Residuals are log ratios of actual to forecast, standardized
+    against each pair's residuals up to the break month. Everything is computed
+    on the whole reporter x partner x month array at once.
+    """
+    values = np.array(cube.values[..., cube.flows.index(flow)])
+    values[values <= 0] = np.nan  # log ratios need positive values
+    n_reporters, n_partners, n_months = values.shape
+
+    # Align the month axis on calendar years: (reporter, partner, year, month of year)
+    first_key = int(cube.month_keys[0])
+    lead = first_key % 12
+    n_years = -(-(lead + n_months) // 12)
+    calendar = np.full((n_reporters, n_partners, n_years * 12), np.nan)
+    calendar[..., lead:lead + n_months] = values
+    calendar = calendar.reshape(n_reporters, n_partners, n_years, 12)
+
+    forecast = _prior_years_mean(calendar, years).reshape(n_reporters, n_partners, -1)
+    forecast = forecast[..., lead:lead + n_months]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residual = np.log(values / forecast)
+
+    before = cube.month_keys <= break_month
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # pairs without enough history
+        mean = np.nanmean(residual[..., before], axis=-1, keepdims=True)
+        std = np.nanstd(residual[..., before], axis=-1, ddof=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_score = (residual - mean) / std
+    z_score[~np.isfinite(z_score)] = np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (values / forecast - 1) * 100
+    return {'values': values, 'forecast': forecast, 'growth': growth, 'z_score': z_score}
+
+
+def breakouts(cube: TradeCube, flow: str = 'EXPORT', years: Optional[int] = None,
+              break_month: int = BREAK_MONTH, min_volume: float = MIN_MONTHLY_VOLUME,
+              min_growth: float = MIN_GROWTH, z_threshold: float = Z_THRESHOLD,
+              min_run: int = MIN_RUN) -> pd.DataFrame:
+    """First month after the break from which a pair stays anomalous for `min_run` months.
+
+    A month is anomalous when its seasonal-naive Z-score exceeds z_threshold,
+    it is more than min_growth percent above the forecast and its value is
+    above min_volume. Returns one row per reporter-partner pair with a breakout.
+    """
+    scan = seasonal_scan(cube, flow, years, break_month)
+    anomalous = (
+        (scan['z_score'] > z_threshold)
+        & (scan['growth'] > min_growth)
+        & (scan['values'] > min_volume)
+    )
+    anomalous &= (cube.month_keys > break_month)
+
+    # run[..., t] counts the anomalous months in [t, t + min_run)
+    padded = np.concatenate([anomalous, np.zeros((*anomalous.shape[:2], min_run), dtype=bool)], axis=-1)
+    totals = np.concatenate([np.zeros((*anomalous.shape[:2], 1), dtype=int), np.cumsum(padded, axis=-1)], axis=-1)
+    n_months = anomalous.shape[-1]
+    run = totals[..., min_run:min_run + n_months] - totals[..., :n_months]
+    starts = run >= min_run
+
+    reporters, partners = np.nonzero(starts.any(axis=-1))
+    months = starts[reporters, partners].argmax(axis=-1)
+    cells = (reporters, partners, months)
+    return pd.DataFrame({
+        'REPORTER': np.array(cube.reporters, dtype=object)[reporters],
+        'PARTNER': np.array(cube.partners, dtype=object)[partners],
+        'BREAKOUT_MONTH': [month_key_label(key) for key in cube.month_keys[months]],
+        'VALUE_IN_EUR': scan['values'][cells],
+        'FORECAST': scan['forecast'][cells],
+        'GROWTH': scan['growth'][cells],
+        'Z_SCORE': scan['z_score'][cells],
+        'ANOMALOUS_MONTHS': anomalous[reporters, partners].sum(axis=-1),
+    }).sort_values(['BREAKOUT_MONTH', 'Z_SCORE'], ascending=[True, False], ignore_index=True)
+
+
+def eu_breakouts(cube: TradeCube, **kwargs) -> pd.DataFrame:
+    """Breakouts of the EU-27 total exports to every partner"""
+    found = breakouts(cube, **kwargs)
+    eu27 = np.array(cube.reporters, dtype=object)[cube.reporter_mask(EU27_PATTERN)]
+    return found[found['REPORTER'].isin(eu27)].reset_index(drop=True)
+
+
+def seasonal_series(cube: TradeCube, reporter: str, partner: str, flow: str = 'EXPORT',
+                    years: Optional[int] = None) -> pd.DataFrame:
+    """Actual value, seasonal-naive forecast and Z-score of one pair, indexed by month"""
+    scan = seasonal_scan(cube, flow, years)
+    cell = (cube.reporters.index(reporter), cube.partners.index(partner))
+    return pd.DataFrame({
+        'VALUE_IN_EUR': scan['values'][cell],
+        'FORECAST': scan['forecast'][cell],
+        'Z_SCORE': scan['z_score'][cell],
+    }, index=pd.Index(cube.periods, name='PERIOD'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the first post-February 2022 breakout month of every pair")
+    parser.add_argument('--years', type=int, help="Prior years in the seasonal forecast (default: all)")
+    parser.add_argument('--min-volume', type=float, default=MIN_MONTHLY_VOLUME)
+    parser.add_argument('--min-growth', type=float, default=MIN_GROWTH)
+    parser.add_argument('--z-threshold', type=float, default=Z_THRESHOLD)
+    parser.add_argument('--min-run', type=int, default=MIN_RUN)
+    parser.add_argument('--eu', action='store_true', help="Only report the EU-27 total")
+    args = parser.parse_args()
+
+    cube = load_cube()
+    start = time.perf_counter()
+    scan = eu_breakouts if args.eu else breakouts
+    found = scan(cube, years=args.years, min_volume=args.min_volume, min_growth=args.min_growth,
+                 z_threshold=args.z_threshold, min_run=args.min_run)
+    elapsed = time.perf_counter() - start
+
+    print(found.round(2).to_string(index=False, max_colwidth=40))
+    print(f"{cube.values.shape[0]} reporters x {cube.values.shape[1]} partners x {cube.values.shape[2]} months "
+          f"scanned in {elapsed * 1000:.1f} ms, {len(found)} breakouts")
+
+
+if __name__ == "__main__":
+    main()
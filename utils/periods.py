@@ -0,0 +1,121 @@
+import re
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# English labels as exported by Eurostat, plus the French ones of the 2016 extracts
+MONTH_NAMES = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+    'janv': 1, 'févr': 2, 'fevr': 2, 'mars': 3, 'avr': 4, 'mai': 5, 'juin': 6,
+    'juil': 7, 'août': 8, 'aout': 8, 'sept': 9, 'déc': 12,
+}
+
+MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Eurostat prefixes some labels with a YYYYMM code ('201904-Apr. 2019', '201952-Jan.-Dec. 2019')
+CODE_PREFIX = re.compile(r'^\d{6}-')
+ANNUAL_PATTERNS = [
+    re.compile(r'^Y(\d{4})$'),                                  # 'Y2019' (national data)
+    re.compile(r'^(\d{4})$'),                                   # '2019'
+    re.compile(r'^(?:jan|janv)\.?-(?:dec|déc)\.? (\d{4})$', re.IGNORECASE),  # 'Jan.-Dec. 2019'
+]
+MONTH_NAME_PATTERN = re.compile(r'^(\w+)\.? (\d{4})$')          # 'Aug. 2024', 'mars 2016'
+ISO_MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{2})$')            # '2024-08'
+
+# Sentinel for values that could not be parsed with errors='coerce'
+MISSING_KEY = -1
+
+
+def classify_period(label: str) -> Tuple[int, int]:
+    """Return (year, month) of a PERIOD label, month 0 for annual totals"""
+    text = CODE_PREFIX.sub('', str(label).strip())
+
+    for pattern in ANNUAL_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return int(match.group(1)), 0
+
+    match = ISO_MONTH_PATTERN.match(text)
+    if match and 1 <= int(match.group(2)) <= 12:
+        return int(match.group(1)), int(match.group(2))
+
+    match = MONTH_NAME_PATTERN.match(text)
+    if match and match.group(1).lower() in MONTH_NAMES:
+        return int(match.group(2)), MONTH_NAMES[match.group(1).lower()]
+
+    raise ValueError(f"Unexpected PERIOD format: {label!r}")
+
+
+def month_key(year, month):
+    """Contiguous integer key of a month (works on scalars and arrays)"""
+    return year * 12 + month - 1
+
+
+def month_key_label(key: int) -> str:
+    """'YYYY-MM' label of a month key"""
+    year, month = divmod(int(key), 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def parse_periods(values: pd.Series, errors: str = 'raise') -> pd.DataFrame:
+    """Parse a PERIOD column into YEAR, MONTH and MONTH_KEY columns.
+
+    Each distinct label is classified once and the results are gathered back
+    to the rows through the factorized codes. MONTH is 0 and MONTH_KEY is -1
+    for annual totals; with errors='coerce' unparseable labels get YEAR 0 too.
+    """
+    codes, uniques = pd.factorize(values)
+
+    parsed = np.zeros((len(uniques) + 1, 2), dtype=np.int32)  # last row serves missing values
+    for i, label in enumerate(uniques):
+        try:
+            parsed[i] = classify_period(label)
+        except ValueError:
+            if errors != 'coerce':
+                raise
+
+    rows = parsed[codes]  # code -1 picks the trailing zero row
+    year, month = rows[:, 0], rows[:, 1]
+    keys = np.where(month > 0, month_key(year, month), MISSING_KEY)
+    return pd.DataFrame({
+        'YEAR': year.astype('int16'),
+        'MONTH': month.astype('int8'),
+        'MONTH_KEY': keys.astype('int32'),
+    }, index=values.index)
+
+
+def period_years(values: pd.Series) -> pd.Series:
+    """Year of every PERIOD label"""
+    return parse_periods(values)['YEAR']
+
+
+def _format_labels(values: pd.Series, formatter, errors: str) -> pd.Series:
+    codes, uniques = pd.factorize(values)
+    labels = []
+    for label in uniques:
+        try:
+            labels.append(formatter(*classify_period(label)))
+        except ValueError:
+            if errors != 'coerce':
+                raise
+            labels.append(None)
+    labels.append(None)  # missing values
+    return pd.Series(np.array(labels, dtype=object)[codes], index=values.index)
+
+
+def month_labels(values: pd.Series, errors: str = 'raise') -> pd.Series:
+    """'YYYY-MM' label of every monthly PERIOD; annual totals are an error unless coerced"""
+    def formatter(year, month):
+        if month == 0:
+            raise ValueError(f"Annual PERIOD {year} has no month")
+        return f"{year:04d}-{month:02d}"
+    return _format_labels(values, formatter, errors)
+
+
+def eurostat_labels(values: pd.Series, errors: str = 'raise') -> pd.Series:
+    """Canonical English Eurostat label of every PERIOD ('Aug. 2024', 'Jan.-Dec. 2019')"""
+    def formatter(year, month):
+        return f"Jan.-Dec. {year}" if month == 0 else f"{MONTH_LABELS[month - 1]}. {year}"
+    return _format_labels(values, formatter, errors)
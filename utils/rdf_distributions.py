@@ -0,0 +1,191 @@
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from rdflib import Graph
+
+from utils.rdf_writer import write_jsonld, write_observations
+
+# Published files of the observations, in the order they are listed in the metadata
+DISTRIBUTIONS = [
+    {'file': 'eurostat_data.ttl', 'media_type': 'text/turtle', 'title': "Turtle"},
+    {'file': 'eurostat_data.nt.gz', 'media_type': 'application/n-triples', 'compress': 'application/gzip',
+     'title': "gzip-compressed N-Triples"},
+    {'file': 'eurostat_data.json', 'media_type': 'application/ld+json', 'title': "JSON-LD"},
+    {'file': 'eurostat_data.ndjson', 'media_type': 'application/x-ndjson', 'title': "Newline-delimited JSON-LD"},
+    {'file': 'eurostat_data.npz', 'media_type': 'application/octet-stream',
+     'title': "Binary term dictionary and SPO-sorted triple IDs (NumPy)"},
+]
+
+
+def gzip_file(path: str, gz_path: str, level: int = 6):
+    """Compress a file; mtime is left out of the header so equal inputs give equal archives"""
+    tmp_path = f"{gz_path}.{os.getpid()}.tmp"
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as raw, \
+            gzip.GzipFile(filename=os.path.basename(path), mode='wb', fileobj=raw, compresslevel=level,
+                          mtime=0) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(tmp_path, gz_path)
+
+
+def split_ntriples(lines) -> Tuple[List[str], List[str], List[str]]:
+    """Subject, predicate and object terms of N-Triples lines (subjects and predicates hold no spaces)"""
+    subjects, predicates, objects = [], [], []
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line or line.startswith('#'):
+            continue
+        subject, predicate, rest = line.split(' ', 2)
+        subjects.append(subject)
+        predicates.append(predicate)
+        objects.append(rest[:-2].rstrip())  # drop the final ' .'
+    return subjects, predicates, objects
+
+
+def write_binary(nt_path: str, out_path: str):
+    """HDT-style binary of an N-Triples file: a sorted term dictionary and SPO-sorted triple IDs.
+
+    Terms are stored in N-Triples syntax as one UTF-8 buffer with offsets,
+    and every triple as three int32 IDs into the dictionary.
+    """
+    with open(nt_path, encoding='utf-8') as f:
+        columns = split_ntriples(f)
+    terms, ids = np.unique(np.array(columns[0] + columns[1] + columns[2], dtype=object), return_inverse=True)
+    triples = ids.astype(np.int32).reshape(3, -1).T
+    triples = triples[np.lexsort((triples[:, 2], triples[:, 1], triples[:, 0]))]
+
+    encoded = [term.encode('utf-8') for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded], out=offsets[1:])
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, terms=np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets=offsets,
+                        triples=triples)
+    os.replace(tmp_path, out_path)
+
+
+def load_binary(path: str) -> Tuple[List[str], np.ndarray]:
+    """Term dictionary and (n, 3) triple ID array of a binary distribution"""
+    with np.load(path) as data:
+        buffer = data['terms'].tobytes()
+        offsets = data['offsets']
+        triples = data['triples']
+    terms = [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    return terms, triples
+
+
+def binary_ntriples(terms: List[str], triples: np.ndarray) -> Iterator[str]:
+    """N-Triples lines of a binary distribution"""
+    for subject, predicate, obj in triples.tolist():
+        yield f"{terms[subject]} {terms[predicate]} {terms[obj]} .\n"
+
+
+def publish(output_dir: str) -> Dict[str, float]:
+    """Derive the compressed and binary distributions from the merged N-Triples; returns seconds per file"""
+    nt_path = os.path.join(output_dir, 'eurostat_data.nt')
+    timings = {}
+    start = time.perf_counter()
+    gzip_file(nt_path, nt_path + '.gz')
+    timings['eurostat_data.nt.gz'] = time.perf_counter() - start
+    start = time.perf_counter()
+    write_binary(nt_path, os.path.join(output_dir, 'eurostat_data.npz'))
+    timings['eurostat_data.npz'] = time.perf_counter() - start
+    return timings
+
+
+def _load_rdflib(path: str, rdf_format: str) -> int:
+    return len(Graph().parse(path, format=rdf_format))
+
+
+def _load_gzip(path: str) -> int:
+    with gzip.open(path, 'rb') as f:
+        return len(Graph().parse(f, format='nt'))
+
+
+def _load_ndjson(path: str) -> int:
+    graph = Graph()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            graph.parse(data=line, format='json-ld')
+    return len(graph)
+
+
+def _load_binary(path: str) -> int:
+    terms, triples = load_binary(path)
+    return len(triples)
+
+
+def benchmark(frames: List[pd.DataFrame], repeat: int = 1) -> pd.DataFrame:
+    """Write time, size and load time of every distribution, written to a scratch directory.
+
+    Text formats are loaded into an rdflib graph; the binary one into its
+    term dictionary and ID array, which is what a consumer of it reads. The
+    gzip and binary files are derived from the N-Triples file, whose write
+    time is not included in theirs.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        def path(name):
+            return os.path.join(directory, name)
+
+        def write_text(name, writer):
+            with open(path(name), 'w', encoding='utf-8') as out:
+                writer(out)
+
+        writers = {
+            'eurostat_data.ttl': lambda: write_text('eurostat_data.ttl',
+                                                    lambda out: write_observations(frames, out, 'turtle')),
+            'eurostat_data.nt': lambda: write_text('eurostat_data.nt',
+                                                   lambda out: write_observations(frames, out, 'nt')),
+            'eurostat_data.nt.gz': lambda: gzip_file(path('eurostat_data.nt'), path('eurostat_data.nt.gz')),
+            'eurostat_data.json': lambda: write_text('eurostat_data.json', lambda out: write_jsonld(frames, out)),
+            'eurostat_data.ndjson': lambda: write_text('eurostat_data.ndjson',
+                                                       lambda out: write_observations(frames, out, 'jsonld')),
+            'eurostat_data.npz': lambda: write_binary(path('eurostat_data.nt'), path('eurostat_data.npz')),
+        }
+        loaders = {
+            'eurostat_data.ttl': lambda: _load_rdflib(path('eurostat_data.ttl'), 'turtle'),
+            'eurostat_data.nt': lambda: _load_rdflib(path('eurostat_data.nt'), 'nt'),
+            'eurostat_data.nt.gz': lambda: _load_gzip(path('eurostat_data.nt.gz')),
+            'eurostat_data.json': lambda: _load_rdflib(path('eurostat_data.json'), 'json-ld'),
+            'eurostat_data.ndjson': lambda: _load_ndjson(path('eurostat_data.ndjson')),
+            'eurostat_data.npz': lambda: _load_binary(path('eurostat_data.npz')),
+        }
+        for name, write in writers.items():
+            write_times, load_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                write()
+                write_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                triples = loaders[name]()
+                load_times.append(time.perf_counter() - start)
+            rows.append({
+                'file': name,
+                'write_s': min(write_times),
+                'bytes': os.path.getsize(path(name)),
+                'load_s': min(load_times),
+                'triples': triples,
+            })
+    return pd.DataFrame(rows)
+
+
+def main():
+    from rdf_creator import folders, load_folder  # rdf_creator imports this module
+
+    parser = argparse.ArgumentParser(description="Benchmark the RDF distributions of the observations")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per format; the best time is reported")
+    args = parser.parse_args()
+
+    frames = [df for df in (load_folder(country, folder_path) for country, folder_path in folders.items())
+              if not df.empty]
+    print(benchmark(frames, args.repeat).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
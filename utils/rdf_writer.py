@@ -0,0 +1,222 @@
+import hashlib
+import json
+import shutil
+from typing import Dict, Iterable, List, TextIO
+
+import numpy as np
+import pandas as pd
+
+from utils.countries import WIKIDATA, country_iri, resolve_column
+
+EX = "https://sanctions.streamlit.app/ns#"
+QB = "http://purl.org/linked-data/cube#"
+GR = "http://purl.org/goodrelations/v1#"
+DCAT = "http://www.w3.org/ns/dcat#"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+DATASET_URI = EX + "dataset/eurostat_exports"
+
+# Prefixes rdflib emits for the observation graph, in its (sorted) order
+TURTLE_PREFIXES = {
+    'dcat': DCAT,
+    'ex': EX,
+    'gr': GR,
+    'qb': QB,
+    'wikidata': WIKIDATA,
+    'xsd': XSD,
+}
+
+# Compact JSON-LD context of the observations; partOf states dcat:hasPart from the dataset side
+JSONLD_CONTEXT = {
+    'dcat': DCAT,
+    'ex': EX,
+    'gr': GR,
+    'qb': QB,
+    'wikidata': WIKIDATA,
+    'xsd': XSD,
+    'reporter': {'@id': 'ex:reporter', '@type': '@id'},
+    'partner': {'@id': 'ex:partner', '@type': '@id'},
+    'flow': {'@id': 'ex:flow', '@type': '@id'},
+    'period': {'@id': 'ex:period', '@type': 'xsd:gYearMonth'},
+    'valueInEUR': {'@id': 'ex:valueInEUR', '@type': 'xsd:decimal'},
+    'partOf': {'@reverse': 'dcat:hasPart', '@type': '@id'},
+}
+
+CHUNK_SIZE = 50000
+
+# Dimensions that identify an observation; its URI is a hash of their labels
+OBSERVATION_KEY = ['REPORTER', 'PARTNER', 'FLOW', 'PERIOD']
+
+
+def _turtle_iri(iri: str) -> str:
+    """Prefixed name where rdflib would use one, <IRI> otherwise"""
+    if iri.startswith(WIKIDATA):
+        return 'wikidata:' + iri[len(WIKIDATA):]
+    return f'<{iri}>'
+
+
+def _decimal_column(values: pd.Series, nan_term: str) -> pd.Series:
+    """Lexical form of xsd:decimal literals from floats, as rdflib writes Literal(float, XSD.decimal)"""
+    lexical = values.astype(float).astype(str).astype(object)
+    return lexical.where(values.notna(), nan_term)
+
+
+def observation_ids(df: pd.DataFrame) -> pd.Series:
+    """Stable observation IDs: 16 hex digits of a blake2b hash of reporter, partner, flow and period"""
+    columns = [df[column].astype(str).to_numpy(dtype=object) for column in OBSERVATION_KEY]
+    ids = [hashlib.blake2b('\x1f'.join(key).encode('utf-8'), digest_size=8).hexdigest() for key in zip(*columns)]
+    return pd.Series(ids, index=df.index, dtype=object)
+
+
+def check_unique(df: pd.DataFrame):
+    """Refuse observations that would share a URI"""
+    duplicated = df.duplicated(OBSERVATION_KEY)
+    if duplicated.any():
+        raise ValueError(f"{int(duplicated.sum())} observations repeat a reporter/partner/flow/period, "
+                         f"e.g. {df.loc[duplicated, OBSERVATION_KEY].iloc[0].tolist()}")
+
+
+def observation_terms(df: pd.DataFrame, style: str = 'turtle') -> Dict[str, pd.Series]:
+    """Subject, object and literal columns of the observations in a chunk (PERIOD as 'YYYY-MM')"""
+    ids = observation_ids(df)
+    if style == 'turtle':
+        iri = _turtle_iri
+        subject = 'ex:observation' + ids
+        sell, buy = 'gr:Sell', 'gr:Buy'
+        period = '"' + df['PERIOD'].astype(str).astype(object) + '"^^xsd:gYearMonth'
+        value = _decimal_column(df['VALUE_IN_EUR'], '"NaN"^^xsd:decimal')
+    elif style == 'jsonld':
+        # JSON strings of compact IRIs and of the literals' lexical forms, coerced by the context
+        iri = lambda value: json.dumps(_turtle_iri(value).strip('<>'))
+        subject = '"ex:observation' + ids + '"'
+        sell, buy = '"gr:Sell"', '"gr:Buy"'
+        period = resolve_column(df['PERIOD'].astype(str), json.dumps)
+        value = '"' + _decimal_column(df['VALUE_IN_EUR'], 'NaN') + '"'
+    else:
+        iri = lambda value: f'<{value}>'
+        subject = f'<{EX}observation' + ids + '>'
+        sell, buy = f'<{GR}Sell>', f'<{GR}Buy>'
+        period = '"' + df['PERIOD'].astype(str).astype(object) + f'"^^<{XSD}gYearMonth>'
+        value = '"' + _decimal_column(df['VALUE_IN_EUR'], 'NaN') + f'"^^<{XSD}decimal>'
+
+    return {
+        'subject': subject,
+        'reporter': resolve_column(df['REPORTER'].astype(str), lambda label: iri(country_iri(label))),
+        'partner': resolve_column(df['PARTNER'].astype(str), lambda label: iri(country_iri(label))),
+        'flow': pd.Series(np.where(df['FLOW'].astype(str) == 'EXPORT', sell, buy), index=df.index, dtype=object),
+        'period': period,
+        'value': value,
+    }
+
+
+def turtle_header() -> str:
+    return ''.join(f'@prefix {prefix}: <{namespace}> .\n' for prefix, namespace in TURTLE_PREFIXES.items()) + '\n'
+
+
+def turtle_chunk(df: pd.DataFrame) -> str:
+    """Turtle for the observations of a chunk, in the layout rdflib uses for an observation"""
+    terms = observation_terms(df, 'turtle')
+    blocks = (
+        terms['subject'] + ' a qb:Observation ;\n'
+        + '    ex:flow ' + terms['flow'] + ' ;\n'
+        + '    ex:partner ' + terms['partner'] + ' ;\n'
+        + '    ex:period ' + terms['period'] + ' ;\n'
+        + '    ex:reporter ' + terms['reporter'] + ' ;\n'
+        + '    ex:valueInEUR ' + terms['value'] + ' .\n\n'
+    )
+    has_part = (f'<{DATASET_URI}> dcat:hasPart ' + ',\n        '.join(terms['subject']) + ' .\n\n')
+    return has_part + ''.join(blocks)
+
+
+def ntriples_chunk(df: pd.DataFrame) -> str:
+    """N-Triples for the observations of a chunk, including their dcat:hasPart links"""
+    terms = observation_terms(df, 'nt')
+    subject = terms['subject']
+    lines = (
+        subject + f' <{RDF_TYPE}> <{QB}Observation> .\n'
+        + subject + f' <{EX}reporter> ' + terms['reporter'] + ' .\n'
+        + subject + f' <{EX}partner> ' + terms['partner'] + ' .\n'
+        + subject + f' <{EX}flow> ' + terms['flow'] + ' .\n'
+        + f'<{DATASET_URI}> <{DCAT}hasPart> ' + subject + ' .\n'
+        + subject + f' <{EX}period> ' + terms['period'] + ' .\n'
+        + subject + f' <{EX}valueInEUR> ' + terms['value'] + ' .\n'
+    )
+    return ''.join(lines)
+
+
+def jsonld_chunk(df: pd.DataFrame) -> str:
+    """One compact JSON-LD node per line, each carrying the context so a line is a document of its own"""
+    terms = observation_terms(df, 'jsonld')
+    context = json.dumps(JSONLD_CONTEXT, separators=(',', ':'))
+    lines = (
+        '{"@context":' + context + ',"@id":' + terms['subject'] + ',"@type":"qb:Observation"'
+        + ',"partOf":"ex:dataset/eurostat_exports"'
+        + ',"flow":' + terms['flow'] + ',"partner":' + terms['partner'] + ',"period":' + terms['period']
+        + ',"reporter":' + terms['reporter'] + ',"valueInEUR":' + terms['value'] + '}\n'
+    )
+    return ''.join(lines)
+
+
+def write_observations(frames: Iterable[pd.DataFrame], out: TextIO, style: str = 'turtle',
+                       chunk_size: int = CHUNK_SIZE) -> int:
+    """Stream observations to a Turtle or N-Triples file, one chunk of rows at a time.
+
+    Memory is bounded by the largest input frame plus one chunk of text; no
+    rdflib terms are created. The 'jsonld' style writes newline-delimited
+    JSON-LD. Returns the number of observations written.
+    """
+    if style == 'turtle':
+        out.write(turtle_header())
+    write_chunk = {'turtle': turtle_chunk, 'nt': ntriples_chunk, 'jsonld': jsonld_chunk}[style]
+
+    written = 0
+    for df in frames:
+        for offset in range(0, len(df), chunk_size):
+            chunk = df.iloc[offset:offset + chunk_size]
+            out.write(write_chunk(chunk))
+            written += len(chunk)
+    return written
+
+
+def merge_shards(paths: List[str], out: TextIO, style: str = 'turtle'):
+    """Concatenate shard files into one document, keeping a single Turtle prefix header"""
+    header = turtle_header() if style == 'turtle' else ''
+    out.write(header)
+    for path in paths:
+        with open(path, encoding='utf-8') as shard:
+            if shard.read(len(header)) != header:
+                raise ValueError(f"{path} does not start with the expected prefixes")
+            shutil.copyfileobj(shard, out)
+
+
+def _jsonld_document(lines: Iterable[str], out: TextIO) -> int:
+    """Write NDJSON-LD lines as one document with a single context and a @graph array"""
+    prefix = '{"@context":' + json.dumps(JSONLD_CONTEXT, separators=(',', ':')) + ','
+    out.write('{"@context": ' + json.dumps(JSONLD_CONTEXT, indent=1) + ',\n"@graph": [')
+    written = 0
+    for line in lines:
+        if not line.startswith(prefix):
+            raise ValueError("NDJSON-LD line without the expected context")
+        out.write((',\n{' if written else '\n{') + line[len(prefix):].rstrip('\n'))
+        written += 1
+    out.write('\n]}\n')
+    return written
+
+
+def write_jsonld(frames: Iterable[pd.DataFrame], out: TextIO, chunk_size: int = CHUNK_SIZE) -> int:
+    """Stream observations to a compact JSON-LD document, one chunk of rows at a time"""
+    def lines():
+        for df in frames:
+            for offset in range(0, len(df), chunk_size):
+                yield from jsonld_chunk(df.iloc[offset:offset + chunk_size]).splitlines()
+    return _jsonld_document(lines(), out)
+
+
+def ndjson_to_jsonld(paths: List[str], out: TextIO) -> int:
+    """Stream newline-delimited JSON-LD shards into one JSON-LD document"""
+    def lines():
+        for path in paths:
+            with open(path, encoding='utf-8') as shard:
+                yield from shard
+    return _jsonld_document(lines(), out)
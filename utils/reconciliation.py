@@ -0,0 +1,196 @@
+import argparse
+import glob
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.convert_national import OUTPUT_DIR
+from utils.countries import country_registry
+from utils.cube import TradeCube, load_cube
+from utils.labels import EU27_PATTERN
+from utils.periods import parse_periods
+
+# Imports are valued CIF (with freight and insurance), exports FOB; the IMF
+# Direction of Trade Statistics assumes imports run 6% above the mirror exports
+CIF_FOB_FACTOR = 1.06
+
+# Years from which a pair's discrepancy counts as post-sanctions
+SHIFT_YEAR = 2022
+
+MIRROR_COLUMNS = ['EXPORTER', 'IMPORTER', 'YEAR', 'EUROSTAT_EXPORTS', 'NATIONAL_IMPORTS', 'DISCREPANCY',
+                  'DISCREPANCY_PCT', 'NATIONAL_IMPORTS_FOB', 'ADJUSTED_DISCREPANCY', 'ADJUSTED_PCT']
+
+
+def load_national_imports(directory: str = OUTPUT_DIR) -> pd.DataFrame:
+    """Yearly rows of every converted national import table"""
+    frames = [pd.read_csv(path) for path in sorted(glob.glob(os.path.join(directory, '*_import_yearly.csv')))]
+    df = pd.concat(frames, ignore_index=True)
+    return df[df['FLOW'] == 'IMPORT']
+
+
+def _pair_keys(exporters: np.ndarray, importers: np.ndarray, years: np.ndarray,
+               first_year: int, n_years: int) -> np.ndarray:
+    """One int64 per exporter x importer x year, ordered by exporter, then importer, then year"""
+    n_countries = len(country_registry().entries)
+    return (exporters * n_countries + importers) * n_years + (years - first_year)
+
+
+def _sum_by_key(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted distinct keys and the sum of the values of each"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=values, minlength=len(unique))
+
+
+def eurostat_exports(cube: TradeCube) -> pd.DataFrame:
+    """Yearly exports of every member state, and of the EU27 total, to every partner of the cube.
+
+    Only years with all twelve months on the cube's month axis are kept, so a
+    year Eurostat has not finished publishing is not compared with a full one.
+    """
+    registry = country_registry()
+    reporters = cube.member_states() | cube.reporter_mask(EU27_PATTERN)
+    exporter_rows = registry.rows(pd.Series(cube.reporters))[reporters]
+    importer_rows = registry.rows(pd.Series(cube.partners))
+    if len(np.unique(exporter_rows)) != len(exporter_rows):
+        raise ValueError("Several Eurostat reporters resolve to the same country in data/countries.csv")
+
+    block = cube.values[reporters, :, :, cube.flows.index('EXPORT')]
+    years = cube.month_keys // 12
+    starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    complete = np.diff(np.r_[starts, len(years)]) == 12
+    totals = np.add.reduceat(np.nan_to_num(block), starts, axis=2)[:, :, complete]
+    reported = np.add.reduceat(~np.isnan(block), starts, axis=2)[:, :, complete] > 0
+
+    exporter, importer, year = np.nonzero(reported)
+    return pd.DataFrame({
+        'EXPORTER': exporter_rows[exporter],
+        'IMPORTER': importer_rows[importer],
+        'YEAR': years[starts[complete]][year],
+        'VALUE_IN_EUR': totals[exporter, importer, year],
+    })
+
+
+def national_imports(national: pd.DataFrame) -> pd.DataFrame:
+    """Yearly imports of every national reporter from every partner, as registry rows"""
+    registry = country_registry()
+    periods = parse_periods(national['PERIOD'].astype(str))
+    yearly = (periods['MONTH'] == 0).to_numpy()
+    return pd.DataFrame({
+        'EXPORTER': registry.rows(national['PARTNER'])[yearly],
+        'IMPORTER': registry.rows(national['REPORTER'])[yearly],
+        'YEAR': periods['YEAR'].to_numpy(dtype=np.int64)[yearly],
+        'VALUE_IN_EUR': national['VALUE_IN_EUR'].to_numpy(dtype=float)[yearly],
+    })
+
+
+def reconcile(exports: pd.DataFrame, imports: pd.DataFrame, cif_fob: float = CIF_FOB_FACTOR) -> pd.DataFrame:
+    """Mirror table of every exporter x importer x year both sides report.
+
+    Both sides are reduced to sorted int64 keys of registry rows and year and
+    joined in one merge pass (a binary search of the export keys in the
+    import keys). Discrepancies are Eurostat minus national, in EUR and as a
+    percentage of the Eurostat value; the adjusted ones first bring the CIF
+    imports to FOB by dividing them by ``cif_fob``.
+    """
+    exports = exports[(exports['EXPORTER'] >= 0) & (exports['IMPORTER'] >= 0)]
+    imports = imports[(imports['EXPORTER'] >= 0) & (imports['IMPORTER'] >= 0)]
+    first_year = int(min(exports['YEAR'].min(), imports['YEAR'].min()))
+    n_years = int(max(exports['YEAR'].max(), imports['YEAR'].max())) - first_year + 1
+
+    def keyed(df):
+        keys = _pair_keys(df['EXPORTER'].to_numpy(np.int64), df['IMPORTER'].to_numpy(np.int64),
+                          df['YEAR'].to_numpy(np.int64), first_year, n_years)
+        return _sum_by_key(keys, df['VALUE_IN_EUR'].to_numpy(dtype=float))
+
+    export_keys, export_values = keyed(exports)
+    import_keys, import_values = keyed(imports)
+    positions = np.minimum(np.searchsorted(import_keys, export_keys), max(len(import_keys) - 1, 0))
+    matched = import_keys[positions] == export_keys if len(import_keys) else np.zeros(len(export_keys), bool)
+
+    keys = export_keys[matched]
+    eurostat = export_values[matched]
+    national = import_values[positions[matched]]
+    national_fob = national / cif_fob
+    n_countries = len(country_registry().entries)
+    pairs, year = np.divmod(keys, n_years)
+    exporter, importer = np.divmod(pairs, n_countries)
+    names = country_registry().entries['name'].to_numpy(dtype=object)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'EXPORTER': names[exporter],
+            'IMPORTER': names[importer],
+            'YEAR': year + first_year,
+            'EUROSTAT_EXPORTS': eurostat,
+            'NATIONAL_IMPORTS': national,
+            'DISCREPANCY': eurostat - national,
+            'DISCREPANCY_PCT': np.round((eurostat - national) / eurostat * 100, 2),
+            'NATIONAL_IMPORTS_FOB': national_fob,
+            'ADJUSTED_DISCREPANCY': eurostat - national_fob,
+            'ADJUSTED_PCT': np.round((eurostat - national_fob) / eurostat * 100, 2),
+        }, columns=MIRROR_COLUMNS)
+
+
+def pair_shifts(mirror: pd.DataFrame, shift_year: int = SHIFT_YEAR) -> pd.DataFrame:
+    """Mean discrepancy percentages of every pair before and from ``shift_year``, and their difference"""
+    pairs = [mirror['EXPORTER'], mirror['IMPORTER']]
+    post = mirror['YEAR'] >= shift_year
+
+    def mean(column, period):
+        return mirror[column].where(period).groupby(pairs, sort=False).mean()
+
+    shifts = pd.DataFrame({
+        'YEARS': mirror.groupby(pairs, sort=False).size(),
+        'PRE_PCT': mean('DISCREPANCY_PCT', ~post),
+        'POST_PCT': mean('DISCREPANCY_PCT', post),
+        'ADJUSTED_PRE_PCT': mean('ADJUSTED_PCT', ~post),
+        'ADJUSTED_POST_PCT': mean('ADJUSTED_PCT', post),
+    })
+    shifts['SHIFT_PP'] = shifts['POST_PCT'] - shifts['PRE_PCT']
+    shifts['ADJUSTED_SHIFT_PP'] = shifts['ADJUSTED_POST_PCT'] - shifts['ADJUSTED_PRE_PCT']
+    return shifts.reset_index()
+
+
+def discrepancy_matrix(mirror: pd.DataFrame, column: str = 'DISCREPANCY_PCT',
+                       year: Optional[int] = None) -> pd.DataFrame:
+    """Exporter x importer matrix of one mirror column, for a year or averaged over all years"""
+    if year is not None:
+        mirror = mirror[mirror['YEAR'] == year]
+    return mirror.pivot_table(index='EXPORTER', columns='IMPORTER', values=column, aggfunc='mean')
+
+
+def build_mirror(cube: Optional[TradeCube] = None, national: Optional[pd.DataFrame] = None,
+                 cif_fob: float = CIF_FOB_FACTOR) -> pd.DataFrame:
+    """Mirror table of the cached Eurostat cube and the converted national statistics"""
+    cube = cube if cube is not None else load_cube()
+    national = national if national is not None else load_national_imports()
+    return reconcile(eurostat_exports(cube), national_imports(national), cif_fob)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile Eurostat exports with national import statistics")
+    parser.add_argument('--importer', help="Only show pairs with this importer")
+    parser.add_argument('--cif-fob', type=float, default=CIF_FOB_FACTOR, help="CIF/FOB factor of the imports")
+    parser.add_argument('--shifts', action='store_true', help="Show the post-2022 shift of every pair")
+    args = parser.parse_args()
+
+    cube, national = load_cube(), load_national_imports()
+    start = time.perf_counter()
+    mirror = build_mirror(cube, national, args.cif_fob)
+    elapsed = time.perf_counter() - start
+    if args.importer:
+        mirror = mirror[mirror['IMPORTER'] == args.importer]
+
+    pd.set_option('display.width', 200)
+    if args.shifts:
+        print(pair_shifts(mirror).sort_values('SHIFT_PP', ascending=False).to_string(index=False))
+    else:
+        print(mirror.to_string(index=False))
+    print(f"{len(mirror)} mirror rows in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyoxigraph
+except ImportError:  # optional dependency: pip install pyoxigraph
+    pyoxigraph = None
+
+from rdf_creator import folders, load_folder
+from utils.countries import country_iris
+from utils.eurostat_cache import file_fingerprint
+from utils.rdf_writer import EX, GR, QB, WIKIDATA, XSD
+
+STORE_DIR = 'data/cache/sparql'
+SOURCE_PATH = 'data/ttl/eurostat_data.ttl'
+
+# EU and euro area totals are reported next to the member states; sums leave them out
+AGGREGATE_REPORTERS = [WIKIDATA + 'Q458', WIKIDATA + 'Q25127']
+
+PREFIXES = f"""PREFIX ex: <{EX}>
+PREFIX gr: <{GR}>
+PREFIX qb: <{QB}>
+PREFIX wikidata: <{WIKIDATA}>
+PREFIX xsd: <{XSD}>
+"""
+
+NOT_AGGREGATE = f"FILTER(?reporter NOT IN ({', '.join(f'<{iri}>' for iri in AGGREGATE_REPORTERS)}))"
+
+# Canned analytical queries over the observations
+QUERIES = {
+    'partner_year_totals': PREFIXES + f"""
+SELECT ?partner ?year (SUM(?value) AS ?total) WHERE {{
+  ?obs ex:reporter ?reporter ; ex:partner ?partner ; ex:period ?period ; ex:valueInEUR ?value .
+  {NOT_AGGREGATE}
+  BIND(SUBSTR(STR(?period), 1, 4) AS ?year)
+}}
+GROUP BY ?partner ?year
+ORDER BY ?partner ?year
+""",
+    'largest_2022_jump': PREFIXES + f"""
+SELECT ?reporter ?v2021 ?v2022 ((?v2022 - ?v2021) AS ?jump) WHERE {{
+  {{
+    SELECT ?reporter
+           (SUM(IF(STRSTARTS(STR(?period), "2021"), ?value, 0)) AS ?v2021)
+           (SUM(IF(STRSTARTS(STR(?period), "2022"), ?value, 0)) AS ?v2022)
+    WHERE {{
+      ?obs ex:reporter ?reporter ; ex:period ?period ; ex:valueInEUR ?value .
+      {NOT_AGGREGATE}
+    }}
+    GROUP BY ?reporter
+  }}
+}}
+ORDER BY DESC(?jump)
+LIMIT 10
+""",
+    'kyrgyzstan_monthly': PREFIXES + f"""
+SELECT ?period (SUM(?value) AS ?total) WHERE {{
+  ?obs ex:partner wikidata:Q813 ; ex:reporter ?reporter ; ex:period ?period ; ex:valueInEUR ?value .
+  {NOT_AGGREGATE}
+}}
+GROUP BY ?period
+ORDER BY STR(?period)
+""",
+}
+
+NUMERIC_DATATYPES = {XSD + 'decimal', XSD + 'integer', XSD + 'double', XSD + 'float'}
+
+
+def require_pyoxigraph():
+    if pyoxigraph is None:
+        raise ImportError("The SPARQL store needs pyoxigraph: pip install pyoxigraph")
+
+
+def _marker_path(store_dir: str) -> str:
+    return f"{store_dir.rstrip(os.sep)}.json"
+
+
+def open_store(store_dir: str = STORE_DIR, source_path: str = SOURCE_PATH, reload: bool = False):
+    """Open the on-disk Oxigraph store, bulk loading the Turtle file when it changed.
+
+    Oxigraph keeps SPO, POS and OSP indexes, so patterns bound on ex:partner,
+    ex:period or ex:reporter values are index lookups. Queries run against
+    the store on disk; the Turtle file is parsed only when it is (re)loaded.
+    """
+    require_pyoxigraph()
+    fingerprint = file_fingerprint(source_path)['sha256']
+    try:
+        with open(_marker_path(store_dir), encoding='utf-8') as f:
+            loaded = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        loaded = {}
+
+    store = pyoxigraph.Store(store_dir)
+    if reload or loaded.get('sha256') != fingerprint:
+        start = time.perf_counter()
+        store.clear()
+        store.bulk_load(path=source_path, format=pyoxigraph.RdfFormat.TURTLE)
+        store.optimize()
+        with open(_marker_path(store_dir), 'w', encoding='utf-8') as f:
+            json.dump({'source': source_path, 'sha256': fingerprint}, f, indent=1)
+        print(f"Loaded {len(store)} triples from {source_path} in {time.perf_counter() - start:.2f}s")
+    return store
+
+
+def _term_value(term):
+    """Python value of a solution term: floats for numeric literals, the IRI or lexical form otherwise"""
+    if term is None:
+        return None
+    if isinstance(term, pyoxigraph.Literal) and term.datatype.value in NUMERIC_DATATYPES:
+        return float(term.value)
+    return term.value
+
+
+def query(store, sparql: str) -> pd.DataFrame:
+    """Run a SELECT query and return its solutions as a frame, one column per variable"""
+    solutions = store.query(sparql)
+    columns = [variable.value for variable in solutions.variables]
+    rows = [[_term_value(solution[column]) for column in columns] for solution in solutions]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def observations_frame() -> pd.DataFrame:
+    """Observations as the store sees them: reporter and partner IRIs, 'YYYY-MM' periods and values"""
+    frames = [load_folder(country, folder_path) for country, folder_path in folders.items()]
+    df = pd.concat([df for df in frames if not df.empty], ignore_index=True)
+    return pd.DataFrame({
+        'reporter': country_iris(df['REPORTER']).astype(str),
+        'partner': country_iris(df['PARTNER']).astype(str),
+        'period': df['PERIOD'].astype(str),
+        'value': df['VALUE_IN_EUR'].astype(float),
+    })
+
+
+def _countries(df: pd.DataFrame) -> pd.DataFrame:
+    return df[~df['reporter'].isin(AGGREGATE_REPORTERS)]
+
+
+def pandas_partner_year_totals(df: pd.DataFrame) -> pd.DataFrame:
+    df = _countries(df)
+    totals = df.groupby(['partner', df['period'].str[:4].rename('year')])['value'].sum()
+    return totals.reset_index(name='total')
+
+
+def pandas_largest_2022_jump(df: pd.DataFrame) -> pd.DataFrame:
+    df = _countries(df)
+    years = df['period'].str[:4]
+    totals = pd.DataFrame({
+        'v2021': df['value'].where(years == '2021', 0).groupby(df['reporter']).sum(),
+        'v2022': df['value'].where(years == '2022', 0).groupby(df['reporter']).sum(),
+    })
+    totals['jump'] = totals['v2022'] - totals['v2021']
+    return totals.sort_values('jump', ascending=False).head(10).rename_axis('reporter').reset_index()
+
+
+def pandas_kyrgyzstan_monthly(df: pd.DataFrame) -> pd.DataFrame:
+    df = _countries(df)
+    df = df[df['partner'] == WIKIDATA + 'Q813']
+    return df.groupby('period')['value'].sum().reset_index(name='total')
+
+
+PANDAS_EQUIVALENTS: Dict[str, Callable[[pd.DataFrame], pd.DataFrame]] = {
+    'partner_year_totals': pandas_partner_year_totals,
+    'largest_2022_jump': pandas_largest_2022_jump,
+    'kyrgyzstan_monthly': pandas_kyrgyzstan_monthly,
+}
+
+
+def same_result(sparql_df: pd.DataFrame, pandas_df: pd.DataFrame) -> bool:
+    """Equal columns and rows, numbers compared with a relative tolerance (decimal vs float sums)"""
+    if list(sparql_df.columns) != list(pandas_df.columns) or len(sparql_df) != len(pandas_df):
+        return False
+    for column in sparql_df.columns:
+        left, right = sparql_df[column].reset_index(drop=True), pandas_df[column].reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(right):
+            if not np.allclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float), rtol=1e-9):
+                return False
+        elif not (left.astype(str) == right.astype(str)).all():
+            return False
+    return True
+
+
+def benchmark(store, df: pd.DataFrame, repeat: int = 3) -> pd.DataFrame:
+    """Best-of-n time of every canned query in SPARQL and with pandas, and whether they agree"""
+    rows = []
+    for name, sparql in QUERIES.items():
+        sparql_times, pandas_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            sparql_df = query(store, sparql)
+            sparql_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            pandas_df = PANDAS_EQUIVALENTS[name](df)
+            pandas_times.append(time.perf_counter() - start)
+        rows.append({
+            'query': name,
+            'rows': len(sparql_df),
+            'sparql_ms': min(sparql_times) * 1000,
+            'pandas_ms': min(pandas_times) * 1000,
+            'match': same_result(sparql_df, pandas_df),
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the trade Data Cube in a persistent SPARQL store")
+    parser.add_argument('--query', choices=list(QUERIES), help="Run one of the canned queries")
+    parser.add_argument('--sparql', help="Run a SPARQL SELECT query (text, or @file to read it from a file)")
+    parser.add_argument('--benchmark', action='store_true', help="Time the canned queries against pandas")
+    parser.add_argument('--reload', action='store_true', help="Reload the store from the Turtle file")
+    parser.add_argument('--source', default=SOURCE_PATH, help="Turtle file to load")
+    parser.add_argument('--store', default=STORE_DIR, help="Directory of the on-disk store")
+    args = parser.parse_args()
+
+    store = open_store(args.store, args.source, args.reload)
+    pd.set_option('display.width', 200)
+    if args.query:
+        print(query(store, QUERIES[args.query]).to_string(index=False))
+    if args.sparql:
+        sparql = args.sparql
+        if sparql.startswith('@'):
+            with open(sparql[1:], encoding='utf-8') as f:
+                sparql = f.read()
+        print(query(store, sparql).to_string(index=False))
+    if args.benchmark:
+        start = time.perf_counter()
+        df = observations_frame()
+        print(f"Loaded {len(df)} observations for pandas in {time.perf_counter() - start:.2f}s")
+        print(benchmark(store, df).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
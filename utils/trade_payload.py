@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import os
+import time
+from typing import Dict, Optional
+
+import pandas as pd
+
+from utils.charts import TOP_K, binned, reporter_ranks, top_k_reporters
+from utils.convert_national import OUTPUT_DIR
+from utils.countries import canonical_names
+from utils.cube import TradeCube, load_cube
+from utils.data_service import frame, open_dataset
+from utils.eurostat_cache import data_version
+from utils.reconciliation import CIF_FOB_FACTOR, SHIFT_YEAR, build_mirror, load_national_imports, pair_shifts
+
+# Bump when the layout of the payload changes
+PAYLOAD_VERSION = 2
+
+# Eurostat PARTNER label of every country tab
+EUROSTAT_PARTNERS = {
+    'Russia': 'Russian Federation (Russia)',
+    'Kyrgyzstan': 'Kyrgyzstan',
+    'Armenia': 'Armenia',
+    'Kazakhstan': 'Kazakhstan',
+    'Uzbekistan': 'Uzbekistan',
+}
+
+# Columns of the comparison table shown on every country tab
+COMPARISON_COLUMNS = {
+    'YEAR': 'Year',
+    'EUROSTAT_EXPORTS': 'Eurostat Data, EUR',
+    'NATIONAL_IMPORTS': 'National Data, EUR',
+    'DISCREPANCY': 'Discrepancy, EUR',
+    'DISCREPANCY_PCT': 'Discrepancy, %',
+    'ADJUSTED_PCT': 'CIF/FOB-adjusted Discrepancy, %',
+}
+
+
+def payload_version() -> str:
+    """Digest of the Eurostat cache, the converted national tables and the payload layout"""
+    sha1 = hashlib.sha1(f"v{PAYLOAD_VERSION}:{data_version()}:{CIF_FOB_FACTOR}:{SHIFT_YEAR}".encode('utf-8'))
+    for name in sorted(os.listdir(OUTPUT_DIR)):
+        stat = os.stat(os.path.join(OUTPUT_DIR, name))
+        sha1.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def eu27_name() -> str:
+    """Canonical name of the EU27 total in the mirror table"""
+    return canonical_names(pd.Series(['European Union - 27 countries'])).iloc[0]
+
+
+def comparison_table(mirror: pd.DataFrame, country_name: str) -> pd.DataFrame:
+    """EU27 exports to a country against its national imports, one row per year"""
+    eu27 = eu27_name()
+    rows = mirror[(mirror['EXPORTER'] == eu27) & (mirror['IMPORTER'] == country_name)]
+    table = rows[list(COMPARISON_COLUMNS)].rename(columns=COMPARISON_COLUMNS).reset_index(drop=True)
+    table.insert(1, 'IMPORTER', country_name)
+    table.insert(2, 'EXPORTER', 'EU')
+    return table
+
+
+def build_payload(cube: Optional[TradeCube] = None, national: Optional[pd.DataFrame] = None) -> Dict[str, pd.DataFrame]:
+    """Every frame page 5 shows, one table per kind with a column naming the tab.
+
+    'by_reporter' holds each tab's exports per reporter summed by month,
+    quarter and year (BIN 'M', 'Q', 'Y'), 'reporter_ranks' the reporters
+    ordered by their total, 'comparison' the EU27 comparison tables, 'shifts'
+    the post-2022 shift of every pair and 'overall' the binned totals of the
+    overall trend.
+    """
+    cube = cube if cube is not None else load_cube()
+    mirror = build_mirror(cube, national if national is not None else load_national_imports())
+
+    by_reporter, ranks, comparison, overall = [], [], [], []
+    for country_name, partner in EUROSTAT_PARTNERS.items():
+        exports = cube.monthly_by_reporter(partner)
+        exports['REPORTER'] = exports['REPORTER'].str.split().str[0]
+        by_reporter.append(binned(exports, 'PERIOD', 'VALUE_IN_EUR', 'REPORTER').assign(COUNTRY=country_name))
+        ranks.append(reporter_ranks(exports).assign(COUNTRY=country_name))
+        comparison.append(comparison_table(mirror, country_name))
+
+        total = cube.monthly_total(partner).reset_index()
+        total = total.rename(columns={'VALUE_IN_EUR': 'Export Value', 'PERIOD': 'Month'})
+        total['Month'] = pd.to_datetime(total['Month'], format='%Y-%m')
+        total['Country'] = country_name
+        overall.append(total)
+
+    return {
+        'by_reporter': pd.concat(by_reporter, ignore_index=True),
+        'reporter_ranks': pd.concat(ranks, ignore_index=True),
+        'comparison': pd.concat(comparison, ignore_index=True),
+        'shifts': pair_shifts(mirror),
+        'overall': binned(pd.concat(overall, ignore_index=True), 'Month', 'Export Value', 'Country'),
+        'mirror': mirror,
+    }
+
+
+def tab_shift(country_name: str) -> Optional[Dict]:
+    """Pre/post-2022 discrepancy means of the EU27 and a country, None without years from 2022"""
+    shifts = frame('trade_payload', 'shifts', EXPORTER=eu27_name(), IMPORTER=country_name)
+    if shifts.empty or pd.isna(shifts['POST_PCT'].iloc[0]):
+        return None
+    return shifts.iloc[0].to_dict()
+
+
+def reporter_exports(country_name: str, freq: str = 'M', top_k: int = TOP_K) -> pd.DataFrame:
+    """PERIOD / REPORTER / VALUE_IN_EUR exports to a tab's country per bin, small reporters summed into 'Other'"""
+    exports = frame('trade_payload', 'by_reporter', COUNTRY=country_name, BIN=freq)
+    return top_k_reporters(exports, frame('trade_payload', 'reporter_ranks', COUNTRY=country_name), top_k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the frames of the data analysis page")
+    parser.parse_args()
+    start = time.perf_counter()
+    tables = open_dataset('trade_payload')
+    print(f"Payload of {sum(t.num_rows for t in tables.values())} rows ready in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,38 +4,11 @@ from pathlib import Path
 from typing import Dict, List
 import logging
 
+from utils.converter_core import convert_national_table, print_unmapped, wide_to_long
+
 class UzbekDataConverter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        
-        self.exchange_rates = {
-            2019: 1.12,
-            2020: 1.14,
-            2021: 1.18,
-            2022: 1.05,
-            2023: 1.07
-        }
-
-        # Mapping for country names to match Eurostat format
-        self.country_mapping = {
-            # Special groupings
-            "European Union": "European Union - 27 countries (from 2020)",
-            "EU countries": "European Union - 27 countries (from 2020)",
-            "Total": "World",
-            "CIS countries": "Commonwealth of Independent States",
-            "EAEU countries": "Eurasian Economic Union",
-            
-            # Individual countries
-            "Russian Federation": "Russia",
-            "USA": "United States",
-            "United Kingdom of Great Britain": "United Kingdom",
-            "Great Britain": "United Kingdom",
-            "UAE": "United Arab Emirates",
-            "Korea, Republic": "South Korea",
-            "Czech Republic": "Czechia",
-            "Slovak Republic": "Slovakia",
-            "Turkiye": "Turkey"
-        }
 
     def read_uzbek_data(self, file_path: str) -> pd.DataFrame:
         """Read and initially process Uzbekistan CSV file"""
@@ -69,84 +42,16 @@ class UzbekDataConverter:
     def convert_to_eurostat_format(self, df: pd.DataFrame) -> pd.DataFrame:
         """Convert Uzbek data to Eurostat format with yearly periods"""
         try:
-            eurostat_data = []
-            
-            # Define EU-27 countries
-            eu27_countries = {
-                "Austria", "Belgium", "Bulgaria", "Croatia", "Cyprus", 
-                "Czechia", "Czech Republic", "Denmark", "Estonia", "Finland",
-                "France", "Germany", "Greece", "Hungary", "Ireland", "Italy",
-                "Latvia", "Lithuania", "Luxembourg", "Malta", "Netherlands",
-                "Poland", "Portugal", "Romania", "Slovakia", "Slovak Republic", 
-                "Slovenia", "Spain", "Sweden"
-            }
-            
-            # Dictionary to store EU-27 totals by year
-            eu27_totals = {}
-            
             # Process only recent years
             recent_years = [str(year) for year in range(2019, 2024)]
-            
-            # Track any unmapped countries
-            unmapped_countries = set()
-            
-            for year in recent_years:
-                year_int = int(year)
-                
-                for _, row in df.iterrows():
-                    country_en = str(row['Klassifikator_en']).strip()
-                    yearly_value_usd = row[year]
-                    
-                    if pd.isna(yearly_value_usd):
-                        continue
-                    
-                    # Convert thousand USD to EUR
-                    yearly_value_eur = float(yearly_value_usd * 1000) / self.exchange_rates.get(year_int, 1.0)
-                    
-                    # Accumulate EU-27 totals
-                    if country_en in eu27_countries:
-                        eu27_totals[year_int] = eu27_totals.get(year_int, 0) + yearly_value_eur
-                    
-                    # Map partner names to match Eurostat
-                    partner = self.country_mapping.get(country_en, country_en)
-                    
-                    if country_en not in self.country_mapping and country_en not in eu27_countries:
-                        unmapped_countries.add(country_en)
-                    
-                    # Create yearly record
-                    eurostat_data.append({
-                        'REPORTER': 'Uzbekistan',
-                        'PARTNER': partner,
-                        'PRODUCT': 'TOTAL',
-                        'FLOW': 'IMPORT',
-                        'STAT_PROCEDURE': 'NORMAL',
-                        'PERIOD': f'Y{year}',
-                        'VALUE_IN_EUR': round(yearly_value_eur, 2)
-                    })
-            
-            # Add EU-27 total rows
-            for year, total in eu27_totals.items():
-                eurostat_data.append({
-                    'REPORTER': 'Uzbekistan',
-                    'PARTNER': 'European Union - 27 countries (from 2020)',
-                    'PRODUCT': 'TOTAL',
-                    'FLOW': 'IMPORT',
-                    'STAT_PROCEDURE': 'NORMAL',
-                    'PERIOD': f'Y{year}',
-                    'VALUE_IN_EUR': round(total, 2)
-                })
-            
-            if unmapped_countries:
-                print("\nWarning: Found countries without explicit mapping:")
-                print(sorted(unmapped_countries))
-                print("These will be used as-is. Please verify if they match Eurostat naming conventions.")
-            
-            # Convert to DataFrame
-            eurostat_df = pd.DataFrame(eurostat_data)
-            
-            # Sort by period and partner
-            if not eurostat_df.empty:
-                eurostat_df = eurostat_df.sort_values(['PERIOD', 'PARTNER'])
+            yearly = wide_to_long(df, 'Klassifikator_en', recent_years)
+            
+            # EU-27 totals by year are appended to the partner rows
+            eurostat_df, unmapped_countries = convert_national_table(
+                yearly['country'], yearly['year'], yearly['value'], 'Uzbekistan',
+                eu27_total=True
+            )
+            print_unmapped(unmapped_countries)
             
             return eurostat_df
             
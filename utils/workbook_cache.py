@@ -0,0 +1,152 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from numbers import Number
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'data/cache/workbooks'
+WORKBOOK_PATTERNS = ['data/**/*.xls', 'data/**/*.xlsx']
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_dir(digest: str) -> str:
+    return os.path.join(CACHE_DIR, digest[:32])
+
+
+def _sheet_file(sheet_name: str) -> str:
+    return f"{hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()[:16]}.parquet"
+
+
+def _columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """Make a raw cell grid storable as Parquet without changing what the readers see.
+
+    Object columns holding only numbers become float64 (what pd.to_numeric would
+    give), and columns mixing text and numbers are stored as text, which
+    pd.to_numeric parses back to the same floats. Missing cells stay missing.
+    """
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if values.dtype != object:
+            continue
+        present = values[values.notna()]
+        if present.map(lambda value: isinstance(value, Number) and not isinstance(value, bool)).all():
+            df[column] = values.astype(float)
+        else:
+            df[column] = values.map(lambda value: value if pd.isna(value) else str(value)).astype(object)
+    df.columns = [str(column) for column in df.columns]
+    return df
+
+
+def _convert_workbook(path: str, digest: str) -> dict:
+    """Parse every sheet of a workbook once and store it as Parquet next to a sheet index"""
+    start = time.perf_counter()
+    workbook = pd.ExcelFile(path)
+    index = {'source': path, 'sheets': {}}
+
+    tmp_dir = f"{_entry_dir(digest)}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for sheet_name in workbook.sheet_names:
+        sheet = workbook.parse(sheet_name, header=None)
+        file_name = _sheet_file(str(sheet_name))
+        _columnar(sheet).to_parquet(os.path.join(tmp_dir, file_name), index=False)
+        index['sheets'][str(sheet_name)] = file_name
+    index['sheet_names'] = [str(name) for name in workbook.sheet_names]
+    workbook.close()
+    with open(os.path.join(tmp_dir, 'sheets.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+    # Another process may have converted the same workbook meanwhile; either copy is fine
+    try:
+        os.rename(tmp_dir, _entry_dir(digest))
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info("Cached %d sheets of %s in %.2fs", len(index['sheet_names']), path, time.perf_counter() - start)
+    index['dir'] = _entry_dir(digest)
+    return index
+
+
+def _workbook_index(path: str) -> dict:
+    digest = file_digest(path)
+    index_path = os.path.join(_entry_dir(digest), 'sheets.json')
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return _convert_workbook(path, digest)
+    index['dir'] = _entry_dir(digest)
+    return index
+
+
+def sheet_names(path: str) -> List[str]:
+    """Sheet names of a workbook, without opening it once it is cached"""
+    return _workbook_index(path)['sheet_names']
+
+
+def read_sheet(path: str, sheet_name: Union[int, str] = 0) -> pd.DataFrame:
+    """Raw cell grid of a sheet, like pd.read_excel(path, sheet_name, header=None)"""
+    index = _workbook_index(path)
+    if isinstance(sheet_name, int):
+        sheet_name = index['sheet_names'][sheet_name]
+    df = pd.read_parquet(os.path.join(index['dir'], index['sheets'][str(sheet_name)]))
+    df.columns = range(len(df.columns))
+    return df
+
+
+def find_row(df: pd.DataFrame, text: str, column=0) -> Optional[int]:
+    """Index label of the first row whose cell in `column` is a string containing `text`"""
+    values = df[column]
+    if values.dtype != object and not pd.api.types.is_string_dtype(values):
+        return None
+    matches = values.str.contains(text, regex=False, na=False).to_numpy(dtype=bool)
+    return df.index[int(np.argmax(matches))] if matches.any() else None
+
+
+def prune(paths: List[str]) -> int:
+    """Remove cached workbooks that no longer match any of the given files"""
+    keep = {os.path.basename(_entry_dir(file_digest(path))) for path in paths}
+    removed = 0
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name not in keep:
+                shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+                removed += 1
+    return removed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert every national statistics workbook to cached Parquet sheets")
+    parser.add_argument('--prune', action='store_true', help="Remove cached workbooks whose source changed or is gone")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in WORKBOOK_PATTERNS for path in glob.glob(pattern, recursive=True)
+                    if not path.startswith(CACHE_DIR)})
+    start = time.perf_counter()
+    for path in paths:
+        print(f"{path}: {len(sheet_names(path))} sheets")
+    print(f"{len(paths)} workbooks cached in {time.perf_counter() - start:.2f}s")
+    if args.prune:
+        print(f"Removed {prune(paths)} stale cache entries")
+
+
+if __name__ == "__main__":
+    main()